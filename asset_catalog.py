@@ -0,0 +1,452 @@
+"""
+Catálogo SQLite de Assets
+Una fila por asset producido (bioma, categoría, item, variación, seed, prompt,
+scores de QA, método, dimensiones y hash del PNG) con índices para las
+consultas habituales. Se rellena a medida que llegan los resultados del
+generador y puede reconstruirse desde un árbol de salida existente.
+Uso:
+    python asset_catalog.py import --root output_assets
+    python asset_catalog.py query --biome Forest --category Props --min_clip 80
+    python asset_catalog.py export assets.csv --method ai --min_aesthetic 6
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import re
+import sqlite3
+import time
+
+from assets_config import ASSETS
+from run_manifest import task_key, variation_number
+from tile_atlas import ATLAS_BASENAME, atlas_rects, is_atlas_path
+from asset_writer import METADATA_LOG, png_file_info
+
+CATALOG_FILENAME = "catalog.sqlite"
+
+COLUMNS = (
+    "key", "path", "biome", "category", "item", "variant", "variation", "method", "seed", "prompt",
+    "clip_score", "aesthetic_score", "is_pixel_art", "qa_scores", "width", "height", "pixel_size", "native_res",
+    "file_hash", "created_at", "metadata"
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    key TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    biome TEXT,
+    category TEXT,
+    item TEXT,
+    variant TEXT,
+    variation INTEGER,
+    method TEXT,
+    seed INTEGER,
+    prompt TEXT,
+    clip_score REAL,
+    aesthetic_score REAL,
+    is_pixel_art INTEGER,
+    qa_scores TEXT,
+    width INTEGER,
+    height INTEGER,
+    pixel_size INTEGER,
+    native_res INTEGER,
+    file_hash TEXT,
+    created_at REAL,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_assets_biome_category ON assets (biome, category);
+CREATE INDEX IF NOT EXISTS idx_assets_item ON assets (item);
+CREATE INDEX IF NOT EXISTS idx_assets_method ON assets (method);
+CREATE INDEX IF NOT EXISTS idx_assets_clip ON assets (clip_score);
+CREATE INDEX IF NOT EXISTS idx_assets_aesthetic ON assets (aesthetic_score);
+CREATE INDEX IF NOT EXISTS idx_assets_file_hash ON assets (file_hash);
+"""
+
+# Columnas añadidas después de la primera versión del esquema (se migran al abrir)
+ADDED_COLUMNS = {"pixel_size": "INTEGER", "native_res": "INTEGER"}
+
+# Orden permitido en las consultas (nunca se interpola texto del usuario en el SQL)
+ORDER_COLUMNS = ("clip_score", "aesthetic_score", "created_at", "biome", "item", "path")
+
+def catalog_path(output_dir: str) -> str:
+    return os.path.join(output_dir, CATALOG_FILENAME)
+
+class AssetCatalog:
+    """
+    Uso:
+        catalog = AssetCatalog("output_assets/catalog.sqlite")
+        catalog.record(key, path, biome=..., category=..., qa_scores=..., ...)
+        rows = catalog.query(biome="Forest", category="Props", min_clip=80)
+        catalog.close()
+    Las escrituras se confirman cada commit_every filas (y al cerrar); la última entrada de cada clave gana.
+    """
+    def __init__(self, path: str, commit_every: int = 100):
+        self.path = path
+        self.commit_every = commit_every
+        self._uncommitted = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")  # Consultas concurrentes mientras se genera
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        existing = {row[1] for row in self.conn.execute("PRAGMA table_info(assets)")}
+        for column, column_type in ADDED_COLUMNS.items():
+            if column not in existing:
+                self.conn.execute(f"ALTER TABLE assets ADD COLUMN {column} {column_type}")
+        self.conn.commit()
+
+    def record(self, key: str, path: str, biome: str = None, category: str = None, item: str = None,
+               variant: str = None, method: str = None, seed: int = None, prompt: str = None,
+               qa_scores: dict = None, width: int = None, height: int = None, file_hash: str = None,
+               created_at: float = None, metadata: dict = None, pixel_grid: dict = None):
+        """
+        Inserta o reemplaza la fila de un asset.
+        pixel_grid: {'pixel_size', 'applied'} del post-procesado (pixel_size = factor generada → guardada).
+        """
+        qa_scores = qa_scores or {}
+        row = {
+            "key": key,
+            "path": path,
+            "biome": biome,
+            "category": category,
+            "item": item,
+            "variant": variant,
+            "variation": variation_number(variant),
+            "method": method,
+            "seed": seed,
+            "prompt": prompt,
+            "clip_score": qa_scores.get("clip_score"),
+            "aesthetic_score": qa_scores.get("aesthetic_score"),
+            "is_pixel_art": None if qa_scores.get("is_pixel_art") is None else int(bool(qa_scores["is_pixel_art"])),
+            "qa_scores": json.dumps(qa_scores) if qa_scores else None,
+            "width": width,
+            "height": height,
+            "pixel_size": pixel_grid.get("pixel_size") if pixel_grid else None,
+            "native_res": int(bool(pixel_grid.get("applied"))) if pixel_grid else None,
+            "file_hash": file_hash,
+            "created_at": created_at if created_at is not None else time.time(),
+            "metadata": json.dumps(metadata, ensure_ascii=False) if metadata else None
+        }
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO assets ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+            [row[column] for column in COLUMNS]
+        )
+
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self._uncommitted = 0
+
+    def query(self, biome: str = None, category: str = None, item: str = None, method: str = None,
+              min_clip: float = None, min_aesthetic: float = None, order_by: str = "clip_score",
+              limit: int = None) -> list:
+        """Filas (dicts) que cumplen todos los filtros indicados, de mayor a menor order_by."""
+        if order_by not in ORDER_COLUMNS:
+            raise ValueError(f"Orden desconocido: {order_by} (opciones: {', '.join(ORDER_COLUMNS)})")
+
+        clauses, params = [], []
+        for column, value in (("biome", biome), ("category", category), ("item", item), ("method", method)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if min_clip is not None:
+            clauses.append("clip_score >= ?")
+            params.append(min_clip)
+        if min_aesthetic is not None:
+            clauses.append("aesthetic_score >= ?")
+            params.append(min_aesthetic)
+
+        sql = "SELECT * FROM assets"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY {order_by} DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def refresh_file_hash(self, path: str, file_hash: str):
+        """Actualiza el hash de todas las filas de un fichero compartido (atlas reescrito con tiles previos)."""
+        self.conn.execute("UPDATE assets SET file_hash = ? WHERE path = ? AND file_hash IS NOT ?", (file_hash, path, file_hash))
+
+    def keys(self) -> set:
+        return {row[0] for row in self.conn.execute("SELECT key FROM assets")}
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM assets").fetchone()[0]
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+# ==========================================
+# IMPORTACIÓN DESDE UN ÁRBOL DE SALIDA
+# ==========================================
+
+# Nombre en disco → nombre del item (los PNG usan '_' en lugar de espacios)
+_ITEM_SLUGS = {
+    (category, item.replace(" ", "_")): item
+    for category, items in ASSETS.items() for item in items
+}
+
+def _parse_asset_path(rel_path: str):
+    """
+    (biome, category, item, variant) a partir de la ruta relativa a la raíz de salida:
+    <biome>/<category>/<item>_<n>.png o <biome>/Characters/<item>/frame_<i>_<desc>.png.
+    """
+    parts = rel_path.replace(os.sep, "/").split("/")
+    if len(parts) < 3:
+        return None
+    biome, category, filename = parts[0], parts[1], parts[-1]
+
+    if len(parts) == 4:
+        frame = re.match(r"frame_(\d+)", filename)
+        if not frame:
+            return None
+        slug, variant = parts[2], f"frame{frame.group(1)}"
+    else:
+        match = re.fullmatch(r"(.+)_(\d+)\.png", filename)
+        if not match:
+            return None
+        slug, variant = match.group(1), f"var{int(match.group(2)) - 1}"
+
+    item = _ITEM_SLUGS.get((category, slug), slug.replace("_", " "))
+    return biome, category, item, variant
+
+def _relative_to_root(path: str, root: str, biome: str) -> str:
+    """
+    Ruta relativa a la raíz de salida. Las rutas del JSONL son las de la ejecución original
+    (relativas a su directorio de trabajo): se toma lo que sigue al directorio del bioma.
+    """
+    absolute = os.path.abspath(path)
+    if absolute.startswith(os.path.abspath(root) + os.sep):
+        return os.path.relpath(absolute, root)
+    parts = path.replace(os.sep, "/").split("/")
+    if biome in parts:
+        index = len(parts) - 1 - parts[::-1].index(biome)
+        return "/".join(parts[index:])
+    return None
+
+def _iter_metadata(root: str):
+    """
+    (ruta relativa, metadata) de cada asset: primero los metadata/*.json sueltos (formato
+    antiguo), después los metadata.jsonl por bioma (más recientes: ganan si se repite la clave).
+    """
+    for meta_path in sorted(glob.glob(os.path.join(root, "**", "metadata", "*.json"), recursive=True)):
+        png_path = os.path.join(os.path.dirname(os.path.dirname(meta_path)),
+                                os.path.basename(meta_path)[:-len(".json")] + ".png")
+        try:
+            with open(meta_path, "r") as f:
+                yield os.path.relpath(png_path, root), json.load(f)
+        except (json.JSONDecodeError, OSError):
+            continue
+
+    for log_path in sorted(glob.glob(os.path.join(root, "*", METADATA_LOG))):
+        biome = os.path.basename(os.path.dirname(log_path))
+        with open(log_path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Línea truncada por un crash: se ignora
+                rel_path = _relative_to_root(entry.get("path", ""), root, biome)
+                if rel_path:
+                    yield rel_path, entry
+
+def import_tree(catalog: AssetCatalog, root: str) -> int:
+    """Rellena el catálogo desde un árbol de salida existente. Retorna el número de filas escritas."""
+    imported = 0
+    file_infos = {}  # Hash y dimensiones reales de cada PNG (la metadata antigua solo tiene las de generación)
+
+    for rel_path, metadata in _iter_metadata(root):
+        path = os.path.join(root, rel_path)
+        if not os.path.exists(path):
+            continue  # Metadata de un asset borrado
+
+        parsed = _parse_asset_path(rel_path)
+        if parsed is None:
+            continue
+        biome, category, item, variant = parsed
+        # La metadata procedural lleva item y variación exactos
+        item = metadata.get("item", item)
+        if metadata.get("variation"):
+            variant = f"var{metadata['variation'] - 1}"
+
+        if path not in file_infos:
+            file_infos[path] = png_file_info(path)
+        file_info = file_infos[path]
+
+        catalog.record(
+            task_key(biome, category, item, variant), path,
+            biome=biome, category=category, item=item, variant=variant,
+            method=metadata.get("method", "ai"),
+            seed=metadata.get("seed"),
+            prompt=metadata.get("prompt"),
+            qa_scores=metadata.get("qa_scores"),
+            width=file_info["width"], height=file_info["height"],
+            file_hash=file_info["file_hash"],
+            created_at=os.path.getmtime(path),
+            pixel_grid=metadata.get("pixel_grid"),
+            metadata={k: v for k, v in metadata.items() if k not in ("path", "qa_scores", "prompt", "seed", "pixel_grid")}
+        )
+        imported += 1
+
+    # Atlas procedurales: una fila por tile del índice (todas apuntan al mismo PNG)
+    for index_path in sorted(glob.glob(os.path.join(root, "*", ATLAS_BASENAME + ".json"))):
+        with open(index_path, "r") as f:
+            payload = json.load(f)
+        png_path = os.path.join(os.path.dirname(index_path), payload["image"])
+        if not os.path.exists(png_path):
+            continue
+
+        biome = payload.get("biome", os.path.basename(os.path.dirname(index_path)))
+        file_hash = png_file_info(png_path)["file_hash"]
+        for tile in payload["tiles"]:
+            variant = f"var{tile['variation'] - 1}"
+            catalog.record(
+                task_key(biome, tile["category"], tile["item"], variant), png_path,
+                biome=biome, category=tile["category"], item=tile["item"], variant=variant,
+                method="procedural", width=tile["w"], height=tile["h"], file_hash=file_hash,
+                created_at=os.path.getmtime(png_path),
+                metadata={"atlas_rect": [tile["x"], tile["y"], tile["w"], tile["h"]]}
+            )
+            imported += 1
+
+    catalog.commit()
+    return imported
+
+def reconcile_manifest(catalog: AssetCatalog, manifest_entries: dict) -> int:
+    """
+    Añade al catálogo las entradas del manifiesto que no tiene (p. ej. tras un crash entre
+    ambos registros): al reanudar se saltan y no volverían a llegar como resultados.
+    Retorna el número de filas añadidas.
+    """
+    known = catalog.keys()
+    file_infos, rects = {}, {}
+    added = 0
+
+    for key, entry in manifest_entries.items():
+        path = entry["output_path"]
+        if key in known or not os.path.exists(path):
+            continue
+        biome, category, item, variant = key.split("|")
+
+        if path not in file_infos:
+            file_infos[path] = png_file_info(path)
+        file_info = file_infos[path]
+        width, height = file_info["width"], file_info["height"]
+        metadata = {"config_hash": entry["config_hash"], "attempts": entry.get("attempts", 1)}
+
+        if is_atlas_path(path):
+            if path not in rects:
+                rects[path] = atlas_rects(path)
+            rect = rects[path].get((category, item, variation_number(variant)))
+            if rect:
+                width, height = rect[2], rect[3]
+                metadata["atlas_rect"] = rect
+
+        catalog.record(
+            key, path, biome=biome, category=category, item=item, variant=variant,
+            method=entry.get("method"), seed=entry.get("seed"), qa_scores=entry.get("qa_scores"),
+            width=width, height=height, file_hash=file_info["file_hash"],
+            created_at=os.path.getmtime(path), metadata=metadata, pixel_grid=entry.get("pixel_grid")
+        )
+        added += 1
+
+    catalog.commit()
+    return added
+
+# ==========================================
+# CLI
+# ==========================================
+
+EXPORT_COLUMNS = ("path", "biome", "category", "item", "variation", "method", "seed", "clip_score",
+                  "aesthetic_score", "width", "height", "pixel_size", "native_res", "file_hash", "prompt")
+
+def _query_args(parser):
+    parser.add_argument("--root", type=str, default="output_assets", help="Carpeta de salida del generador")
+    parser.add_argument("--biome", type=str, default=None)
+    parser.add_argument("--category", type=str, default=None)
+    parser.add_argument("--item", type=str, default=None)
+    parser.add_argument("--method", type=str, default=None, choices=("ai", "procedural"))
+    parser.add_argument("--min_clip", type=float, default=None, help="CLIP score mínimo")
+    parser.add_argument("--min_aesthetic", type=float, default=None, help="Aesthetic score mínimo")
+    parser.add_argument("--order_by", type=str, default="clip_score", choices=ORDER_COLUMNS)
+    parser.add_argument("--limit", type=int, default=None)
+
+def _run_query(catalog: AssetCatalog, args) -> list:
+    return catalog.query(args.biome, args.category, args.item, args.method, args.min_clip,
+                         args.min_aesthetic, args.order_by, args.limit)
+
+def _format_score(value) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+def cmd_import(args):
+    catalog = AssetCatalog(args.db or catalog_path(args.root))
+    start = time.perf_counter()
+    imported = import_tree(catalog, args.root)
+    print(f"📚 {imported} assets importados en {time.perf_counter() - start:.1f}s ({catalog.count()} en el catálogo)")
+    catalog.close()
+
+def cmd_query(args):
+    catalog = AssetCatalog(args.db or catalog_path(args.root))
+    rows = _run_query(catalog, args)
+    catalog.close()
+
+    print(f"{'clip':>6} | {'aesth':>6} | {'tamaño':>9} | ruta")
+    for row in rows:
+        size = f"{row['width']}x{row['height']}" if row["width"] else "-"
+        print(f"{_format_score(row['clip_score']):>6} | {_format_score(row['aesthetic_score']):>6} | {size:>9} | {row['path']}")
+    print(f"{len(rows)} assets")
+
+def cmd_export(args):
+    catalog = AssetCatalog(args.db or catalog_path(args.root))
+    rows = _run_query(catalog, args)
+    catalog.close()
+
+    export_format = args.format or ("csv" if args.output.endswith(".csv") else "json")
+    with open(args.output, "w", newline="") as f:
+        if export_format == "csv":
+            writer = csv.DictWriter(f, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                row["qa_scores"] = json.loads(row["qa_scores"]) if row["qa_scores"] else None
+                row["metadata"] = json.loads(row["metadata"]) if row["metadata"] else None
+            json.dump(rows, f, indent=2, ensure_ascii=False)
+    print(f"💾 {len(rows)} assets exportados a {args.output} ({export_format})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Catálogo SQLite de assets generados")
+    parser.add_argument("--db", type=str, default=None, help=f"Ruta del catálogo (default: <root>/{CATALOG_FILENAME})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Construir/actualizar el catálogo desde un árbol de salida")
+    import_parser.add_argument("--root", type=str, default="output_assets", help="Carpeta de salida del generador")
+    import_parser.set_defaults(func=cmd_import)
+
+    query_parser = subparsers.add_parser("query", help="Listar assets que cumplen los filtros")
+    _query_args(query_parser)
+    query_parser.set_defaults(func=cmd_query)
+
+    export_parser = subparsers.add_parser("export", help="Exportar los assets filtrados a CSV o JSON")
+    export_parser.add_argument("output", type=str, help="Fichero de salida (.csv o .json)")
+    export_parser.add_argument("--format", type=str, default=None, choices=("csv", "json"))
+    _query_args(export_parser)
+    export_parser.set_defaults(func=cmd_export)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
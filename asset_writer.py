@@ -0,0 +1,207 @@
+"""
+Escritor Asíncrono de Assets
+Los workers de post-procesado y procedurales no tocan el disco: envían el
+buffer final y su metadata a una cola y vuelven a trabajar. Un proceso
+escritor (o pocos) guarda los PNG con nivel de compresión configurable,
+cachea los directorios ya creados y agrupa la metadata en un JSONL
+append-only por bioma con fsync periódico. El resultado 'success' lo emite
+el escritor, así el manifiesto solo registra assets que ya están en disco.
+"""
+import io
+import os
+import time
+import zlib
+import json
+import hashlib
+from multiprocessing import Queue, Process
+
+import numpy as np
+from PIL import Image
+
+from qa_service import collect_micro_batch
+from run_manifest import open_jsonl_append
+
+METADATA_LOG = "metadata.jsonl"
+
+def metadata_log_path(output_dir: str, biome: str) -> str:
+    """JSONL de metadata de un bioma (una línea por asset guardado)."""
+    return os.path.join(output_dir, biome, METADATA_LOG)
+
+class _DirCache:
+    """makedirs una sola vez por directorio (sin os.path.exists por cada escritura)."""
+    def __init__(self):
+        self._created = set()
+
+    def ensure(self, path: str):
+        if path and path not in self._created:
+            os.makedirs(path, exist_ok=True)
+            self._created.add(path)
+
+class _MetadataLogs:
+    """Ficheros JSONL abiertos en modo append; flush por batch y fsync cada fsync_interval segundos."""
+    def __init__(self, dirs: _DirCache, fsync_interval: float):
+        self.dirs = dirs
+        self.fsync_interval = fsync_interval
+        self._files = {}
+        self._dirty = set()
+        self._last_sync = time.monotonic()
+
+    def append(self, path: str, entry: dict):
+        f = self._files.get(path)
+        if f is None:
+            self.dirs.ensure(os.path.dirname(path))
+            f = self._files[path] = open_jsonl_append(path)  # Repara una última línea truncada
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._dirty.add(path)
+
+    def flush(self, force_sync: bool = False):
+        for path in self._dirty:
+            self._files[path].flush()
+        self._dirty.clear()
+
+        if force_sync or time.monotonic() - self._last_sync >= self.fsync_interval:
+            for f in self._files.values():
+                os.fsync(f.fileno())
+            self._last_sync = time.monotonic()
+
+    def close(self):
+        self.flush(force_sync=True)
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+def _save_png(image, save_path: str, compress_level: int) -> dict:
+    """Codifica en memoria y escribe de una vez. Retorna {'file_hash', 'width', 'height'} para el catálogo."""
+    if not isinstance(image, Image.Image):
+        image = Image.fromarray(np.asarray(image))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", compress_level=compress_level)
+    data = buffer.getvalue()
+
+    # Reemplazar (no sobrescribir): el destino puede ser un hardlink a la caché de tiles
+    if os.path.lexists(save_path):
+        os.remove(save_path)
+    with open(save_path, "wb") as f:
+        f.write(data)
+
+    return {'file_hash': hashlib.sha256(data).hexdigest(), 'width': image.width, 'height': image.height}
+
+def png_file_info(save_path: str) -> dict:
+    """Hash y dimensiones de un PNG que ya está en disco (p. ej. materializado desde la caché)."""
+    with open(save_path, "rb") as f:
+        data = f.read()
+    with Image.open(io.BytesIO(data)) as image:
+        width, height = image.size
+    return {'file_hash': hashlib.sha256(data).hexdigest(), 'width': width, 'height': height}
+
+def asset_writer_worker(write_queue, results_queue, compress_level: int = 6, fsync_interval: float = 5.0,
+                        max_batch_size: int = 32, max_wait: float = 0.05, tile_cache=None):
+    """
+    Proceso escritor: guarda imágenes y metadata en batches y reporta cada asset por results_queue
+    (con hash SHA-256 y dimensiones del PNG escrito).
+    Cada petición: {'save_path', 'image' (array RGBA, PIL o None si ya está en disco), 'metadata',
+    'metadata_log', 'result', 'cache_key' (opcional, se copia a tile_cache tras guardar)}.
+    """
+    dirs = _DirCache()
+    logs = _MetadataLogs(dirs, fsync_interval)
+
+    stop = False
+    while not stop:
+        batch, stop = collect_micro_batch(write_queue, max_batch_size, max_wait)
+        results = []
+
+        for request in batch:
+            result = request['result']
+            try:
+                save_path = request['save_path']
+                if request.get('image') is not None:
+                    dirs.ensure(os.path.dirname(save_path))
+                    file_info = _save_png(request['image'], save_path, compress_level)
+                    if tile_cache is not None and request.get('cache_key'):
+                        tile_cache.store(request['cache_key'], save_path)
+                else:
+                    file_info = png_file_info(save_path)
+                result = dict(result, **file_info)
+
+                if request.get('metadata_log'):
+                    logs.append(request['metadata_log'], dict(request['metadata'], path=save_path))
+            except Exception as e:
+                print(f"Error en escritor: {e}")
+                result = {
+                    'status': 'error',
+                    'task_id': result['task_id'],
+                    'reason': f"Error al guardar: {str(e)}",
+                    'failure': 'error'
+                }
+
+            results.append(result)
+
+        # La metadata se vuelca (y fsync periódico) ANTES de emitir los resultados: el padre
+        # registra el asset en el manifiesto al recibirlo y al reanudar ya no se regeneraría
+        logs.flush()
+        for result in results:
+            results_queue.put(result)
+
+    logs.close()
+
+class AssetWriterClient:
+    """
+    Cliente ligero para los workers: encola la escritura y retorna inmediatamente.
+    Cada JSONL de metadata se asigna siempre al mismo escritor (un único proceso por fichero).
+    """
+    def __init__(self, write_queues: list):
+        self.write_queues = write_queues
+
+    def write(self, save_path: str, image, metadata: dict, metadata_log: str, result: dict, cache_key: str = None):
+        route = zlib.crc32((metadata_log or save_path).encode("utf-8")) % len(self.write_queues)
+        self.write_queues[route].put({
+            'save_path': save_path,
+            'image': image,
+            'metadata': metadata,
+            'metadata_log': metadata_log,
+            'result': result,
+            'cache_key': cache_key
+        })
+
+class AssetWriter:
+    """
+    Uso:
+        writer = AssetWriter(results_queue, num_writers=1, compress_level=6, fsync_interval=5.0)
+        writer.start()
+        client = writer.client()  # Pasar a cada worker
+        ...
+        writer.stop()  # Después de terminar los workers: vacía colas, fsync y cierra
+    """
+    def __init__(self, results_queue, num_writers: int = 1, compress_level: int = 6,
+                 fsync_interval: float = 5.0, tile_cache=None):
+        if not 0 <= compress_level <= 9:
+            raise ValueError(f"Nivel de compresión PNG fuera de rango: {compress_level} (0-9)")
+        self.results_queue = results_queue
+        self.num_writers = max(1, num_writers)
+        self.compress_level = compress_level
+        self.fsync_interval = fsync_interval
+        self.tile_cache = tile_cache
+
+        self.write_queues = [Queue() for _ in range(self.num_writers)]
+        self.processes = []
+
+    def start(self):
+        for write_queue in self.write_queues:
+            p = Process(
+                target=asset_writer_worker,
+                args=(write_queue, self.results_queue, self.compress_level, self.fsync_interval),
+                kwargs={'tile_cache': self.tile_cache}
+            )
+            p.start()
+            self.processes.append(p)
+
+    def client(self) -> AssetWriterClient:
+        return AssetWriterClient(self.write_queues)
+
+    def stop(self):
+        """Envía señal de terminación (tras las escrituras pendientes) y espera a los escritores."""
+        for write_queue in self.write_queues:
+            write_queue.put(None)
+        for p in self.processes:
+            p.join()
+        self.processes = []
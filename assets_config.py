@@ -152,3 +152,46 @@ PROMPT_TEMPLATES = {
     # Effects: Efectos de alta calidad
     "Effects": "masterpiece, best quality, pixel art, {adjective} {item} in {biome} style, game effect, sharp pixels, vibrant colors, clean design, isolated, white background, professional vfx, highly detailed"
 }
+
+# Mutaciones de prompt para regenerar assets que fallan QA (según el código de fallo)
+# Se anteponen al prompt base (SDXL trunca a 77 tokens, el final del template se pierde)
+RETRY_PROMPT_MUTATIONS = {
+    # Poca relevancia al prompt: reforzar el sujeto
+    "low_clip": [
+        "clearly recognizable {item}, exactly one {item}",
+        "iconic {item}, simple readable silhouette",
+        "{item} as the only subject, filling the frame"
+    ],
+    # Demasiado realista/3D: reforzar la estética pixel art
+    "not_pixel_art": [
+        "flat colors, hard pixel edges, limited palette",
+        "chunky low resolution sprite, no smooth shading",
+        "retro console sprite, no gradients, no realism"
+    ],
+    # Calidad estética baja: pulir composición y color
+    "low_aesthetic": [
+        "polished sprite, harmonious palette, crisp details",
+        "strong silhouette, balanced colors, clean outline",
+        "award winning pixel art, careful shading"
+    ],
+    # Pre-filtro: frame vacío o casi uniforme
+    "empty": [
+        "large detailed {item} filling the frame",
+        "bold colorful {item}, high contrast against white"
+    ],
+    # Pre-filtro: imagen borrosa sin bordes de pixel
+    "blurry": [
+        "sharp pixel edges, crisp pixel grid, no blur",
+        "hard edged pixels, no anti-aliasing, in focus"
+    ],
+    # Pre-filtro: varios objetos / collage / cuadrícula de sprites
+    "multi_object": [
+        "exactly one {item}, single object, no sprite sheet",
+        "one lone {item} centered, no grid, no collage"
+    ],
+    # Cualquier otro fallo (errores, imagen vacía)
+    "default": [
+        "clean sprite, simple composition",
+        "single centered object, plain white background"
+    ]
+}
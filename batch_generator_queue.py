@@ -4,47 +4,78 @@ GPU genera → CPU evalúa en paralelo → Auto-retry si falla QA
 """
 import argparse
 import os
-import torch
 import multiprocessing as mp
-from multiprocessing import Queue, Process, Manager
+from multiprocessing import Queue, Process
 import queue
 import time
-from PIL import Image
 import gc
-import json
+import heapq
+import itertools
 
-from pixel_engine import PixelArtGenerator
-from image_utils import remove_background, crop_to_content, quantize_colors, add_pixel_outline, create_gif, create_sprite_sheet
-from qa_evaluator import init_advanced_qa, evaluate_advanced
-from assets_config import BIOMES, ASSETS, PROMPT_TEMPLATES, BIOME_ADJECTIVES, CHARACTER_FRAMES, PROCEDURAL_CATEGORIES, AI_CATEGORIES
-from procedural_tiles import TileGenerator
+from image_utils import remove_background_with_info, configure_rembg, pre_qa_check, create_gif, create_sprite_sheet
+from postprocess import postprocess_image, postprocess_image_with_info, postprocess_rgba
+from qa_service import QAService
+from shared_frames import SharedImageRing
+from assets_config import BIOMES, ASSETS, PROMPT_TEMPLATES, BIOME_ADJECTIVES, CHARACTER_FRAMES, PROCEDURAL_CATEGORIES, AI_CATEGORIES, RETRY_PROMPT_MUTATIONS
+from procedural_tiles import TileGenerator, BIOME_PALETTES, GENERATOR_VERSION
+from run_manifest import RunManifest, config_hash, task_key
+from tile_atlas import atlas_paths, merge_atlas_rows, pack_atlas, save_atlas
+from tile_cache import TileCache
+from asset_writer import AssetWriter, metadata_log_path, png_file_info
+from asset_catalog import AssetCatalog, catalog_path, reconcile_manifest
+from palette_engine import biome_palette, save_palette
 
 def ensure_dir(path):
     if not os.path.exists(path):
         os.makedirs(path)
 
-def process_and_save_worker(task_queue, results_queue, apply_quantize, apply_outline, min_clip_score, min_aesthetic):
+def process_and_save_worker(task_queue, results_queue, qa_client, image_ring, writer, apply_quantize, apply_outline,
+                            rembg_config=None, matting_config=None, prefilter=True, native_res=True):
     """
     Worker CPU: Procesa y evalúa imágenes en paralelo.
+    La evaluación se delega al servicio QA compartido (no carga modelos aquí).
+    La imagen llega como índice de slot del ring compartido (sin pickling).
     Si falla QA, envía señal para re-encolar.
+    El guardado se delega al escritor asíncrono (writer), que emite el resultado 'success'.
+    La tarea puede traer la paleta fija del bioma ('palette'); si no, cuantización adaptativa.
+    rembg_config: presupuesto de hilos de rembg para este proceso (ver configure_rembg).
+    matting_config: parámetros del matting rápido de fondo blanco (ver remove_background_with_info).
+    prefilter: descarta fallos evidentes (vacía, borrosa, collage...) con NumPy antes de CLIP.
+    native_res: baja cada imagen a su resolución de pixel nativa (rejilla detectada) antes de cuantizar.
     """
-    # Inicializar evaluador en este proceso
-    init_advanced_qa(device="cpu")
+    matting_config = matting_config or {}
+    if rembg_config:
+        configure_rembg(**rembg_config)
     
     while True:
+        slot = None
         try:
             task = task_queue.get(timeout=5)
             if task is None:  # Señal de terminación
                 break
             
-            image = task['image']
+            slot = task['slot']
             save_path = task['save_path']
             prompt = task['prompt']
             metadata = task['metadata']
             task_id = task['task_id']
             
-            # 1. Evaluación con IA
-            qa_result = evaluate_advanced(image, prompt, min_clip_score, min_aesthetic)
+            # 0. Pre-filtro NumPy sobre el slot (sin copia): fallos evidentes no llegan a CLIP
+            if prefilter:
+                check = pre_qa_check(image_ring.view(slot))
+                if not check['ok']:
+                    print(f"   ⛔ PRE-QA FAIL: {task_id} - {check['reason']}")
+                    results_queue.put({
+                        'status': 'retry',
+                        'task_id': task_id,
+                        'reason': check['reason'],
+                        'failure': check['failure'],
+                        'stage': 'prefilter'
+                    })
+                    continue
+            
+            # 1. Evaluación con IA (servicio compartido, lee el slot directamente)
+            qa_result = qa_client.evaluate_slot(slot, prompt)
             
             if not qa_result['is_good']:
                 # ❌ Falló QA - Enviar señal de retry
@@ -52,45 +83,43 @@ def process_and_save_worker(task_queue, results_queue, apply_quantize, apply_out
                 results_queue.put({
                     'status': 'retry',
                     'task_id': task_id,
-                    'reason': qa_result['reason']
+                    'reason': qa_result['reason'],
+                    'failure': qa_result.get('failure', '')
                 })
                 continue
             
             # ✅ Aprobada - Procesar y guardar
             print(f"   ✅ QA PASS: {task_id} (CLIP: {qa_result['clip_score']:.1f}, Aesthetic: {qa_result['aesthetic_score']:.1f})")
             
-            # 2. Procesamiento
-            img_no_bg = remove_background(image)
-            img_cropped = crop_to_content(img_no_bg)
-            
-            if apply_quantize:
-                img_cropped = quantize_colors(img_cropped, num_colors=32)
-            if apply_outline:
-                img_cropped = add_pixel_outline(img_cropped)
+            # 2. Procesamiento (rembg necesita su propia copia PIL; después el slot queda libre)
+            image = image_ring.image(slot)
+            image_ring.release(slot)
+            slot = None
+            img_no_bg, matting_info = remove_background_with_info(image, **matting_config)
             
-            # 3. Guardar imagen
-            img_cropped.save(save_path)
+            # Resolución nativa → recorte → cuantización → contorno sobre un único buffer RGBA (PIL solo al guardar)
+            final_image, grid_info = postprocess_image_with_info(img_no_bg, apply_quantize, apply_outline,
+                                                                 palette=task.get('palette'), native_res=native_res)
             
-            # 4. Guardar metadata (con scores de QA)
+            # 3. Metadata (con scores de QA)
             metadata['qa_scores'] = {
                 'clip_score': qa_result['clip_score'],
                 'aesthetic_score': qa_result['aesthetic_score'],
                 'is_pixel_art': qa_result['is_pixel_art']
             }
+            metadata['size'] = list(final_image.size)
+            # Factor generada → guardada: sin rejilla fiable la imagen queda a resolución generada
+            metadata['pixel_grid'] = grid_info
             
-            meta_dir = os.path.join(os.path.dirname(save_path), "metadata")
-            ensure_dir(meta_dir)
-            meta_filename = os.path.basename(save_path).replace('.png', '.json')
-            meta_path = os.path.join(meta_dir, meta_filename)
-            
-            with open(meta_path, 'w') as f:
-                json.dump(metadata, f, indent=2)
-            
-            # 5. Notificar éxito
-            results_queue.put({
+            # 4. Guardar imagen + metadata en el escritor (notifica el éxito cuando está en disco)
+            writer.write(save_path, final_image, metadata, task.get('metadata_log'), {
                 'status': 'success',
                 'task_id': task_id,
-                'save_path': save_path
+                'save_path': save_path,
+                'seed': metadata.get('seed'),
+                'qa_scores': metadata['qa_scores'],
+                'matting': matting_info,
+                'pixel_grid': grid_info
             })
             
         except queue.Empty:
@@ -101,8 +130,370 @@ def process_and_save_worker(task_queue, results_queue, apply_quantize, apply_out
                 results_queue.put({
                     'status': 'error',
                     'task_id': task_id,
-                    'reason': str(e)
+                    'reason': str(e),
+                    'failure': 'error'
                 })
+        finally:
+            if slot is not None:
+                image_ring.release(slot)
+
+def postprocess_tile(tile_img, apply_quantize, apply_outline, palette=None):
+    """Post-procesado opcional de un tile procedural (sin recorte; paleta fija del bioma si se indica)"""
+    if not (apply_quantize or apply_outline):
+        return tile_img
+    return postprocess_image(tile_img, apply_quantize, apply_outline, palette=palette, crop=False)
+
+def build_biome_atlas(task, apply_quantize, apply_outline):
+    """
+    Modo atlas: genera todos los items procedurales del bioma y los compone
+    en un único PNG + índice JSON (una sola escritura por bioma).
+    Los tiles de otras categorías que ya estaban en el atlas se conservan en su posición.
+    Retorna el índice (un rectángulo por tile).
+    """
+    tile_gen = TileGenerator(tile_size=task['tile_size'])
+    rows = []
+    
+    for entry in task['items']:
+        tiles = tile_gen.generate_batch_arrays(entry['category'], entry['item'], task['biome'], count=task['count'])
+        if len(tiles) != task['count']:
+            raise RuntimeError(f"El generador no produjo los tiles de {entry['item']}")
+        
+        if apply_quantize or apply_outline:
+            # Todas las variaciones del item en un solo batch (N, H, W, 4)
+            tiles = postprocess_rgba(tiles, apply_quantize, apply_outline, palette=task.get('palette'), crop=False)
+        rows.append((entry['category'], entry['item'], tiles))
+    
+    rows = merge_atlas_rows(rows, task['atlas_path'], task['tile_size'])
+    atlas, index = pack_atlas(rows, task['tile_size'])
+    ensure_dir(os.path.dirname(task['atlas_path']))
+    save_atlas(atlas, index, task['atlas_path'], metadata={
+        'method': 'procedural',
+        'biome': task['biome'],
+        'tile_size': task['tile_size'],
+        'tileable': True
+    })
+    return index
+
+def procedural_worker(procedural_queue, results_queue, writer, apply_quantize, apply_outline, tile_cache=None):
+    """
+    Worker CPU procedural: genera y post-procesa tiles en paralelo con la GPU.
+    Cada tile se guarda y se reporta a través del escritor (misma contabilidad que los assets IA);
+    los errores se reportan directamente por results_queue.
+    Las tareas con 'atlas' cubren un bioma completo y se escriben como un único atlas.
+    Con tile_cache, los items cuyos tiles ya están en caché se materializan sin generarse.
+    """
+    while True:
+        try:
+            task = procedural_queue.get(timeout=5)
+        except queue.Empty:
+            continue
+        
+        if task is None:  # Señal de terminación
+            break
+        
+        if task.get('atlas'):
+            task_ids = [task_id for entry in task['items'] for task_id in entry['task_ids']]
+            try:
+                print(f"  🗺️  Atlas procedural: {task['biome']} ({len(task['items'])} items)")
+                index = build_biome_atlas(task, apply_quantize, apply_outline)
+                # Mismos datos que registra el importador del catálogo: hash del atlas + rectángulo del tile
+                file_hash = png_file_info(task['atlas_path'])['file_hash']
+                rects = {(tile['category'], tile['item'], tile['variation']): tile for tile in index}
+                results = []
+                for entry in task['items']:
+                    for variation, task_id in enumerate(entry['task_ids'], start=1):
+                        tile = rects[(entry['category'], entry['item'], variation)]
+                        results.append({
+                            'status': 'success',
+                            'task_id': task_id,
+                            'save_path': task['atlas_path'],
+                            'file_hash': file_hash,
+                            'width': tile['w'],
+                            'height': tile['h'],
+                            'atlas_rect': [tile['x'], tile['y'], tile['w'], tile['h']]
+                        })
+            except Exception as e:
+                print(f"Error en atlas procedural: {e}")
+                results = [{'status': 'error', 'task_id': task_id, 'reason': str(e), 'failure': 'error'} for task_id in task_ids]
+            
+            for result in results:
+                results_queue.put(result)
+            continue
+        
+        biome, category, item = task['biome'], task['category'], task['item']
+        reported = 0
+        
+        try:
+            cached = tile_cache is not None and all(
+                tile_cache.fetch(key, path) for key, path in zip(task['cache_keys'], task['save_paths'])
+            )
+            
+            if cached:
+                print(f"  ♻️  Procedural (caché): {item} ({biome})")
+                procedural_images = [None] * len(task['task_ids'])
+            else:
+                print(f"  🔧 Procedural: {item} ({biome})")
+                tile_gen = TileGenerator(tile_size=task['tile_size'])
+                procedural_images = tile_gen.generate_batch(category, item, biome, count=len(task['task_ids']))
+            
+            for idx, tile_img in enumerate(procedural_images):
+                save_path = task['save_paths'][idx]
+                
+                if tile_img is not None:
+                    # Post-procesado opcional
+                    tile_img = postprocess_tile(tile_img, apply_quantize, apply_outline, task.get('palette'))
+                
+                # Metadata simple
+                metadata = {
+                    'method': 'procedural',
+                    'biome': biome,
+                    'category': category,
+                    'item': item,
+                    'variation': idx + 1,
+                    'tileable': True
+                }
+                
+                # Tiles de la caché ya están en disco: solo se escribe su metadata.
+                # Los nuevos se copian a la caché una vez guardados (en el escritor)
+                writer.write(save_path, tile_img, metadata, task.get('metadata_log'), {
+                    'status': 'success',
+                    'task_id': task['task_ids'][idx],
+                    'save_path': save_path,
+                    'cached': cached
+                }, cache_key=None if cached else task['cache_keys'][idx])
+                reported += 1
+            
+            error = "El generador no produjo el tile"
+        except Exception as e:
+            print(f"Error en worker procedural: {e}")
+            error = str(e)
+        
+        # Cualquier tile no producido se reporta como error para que pending_tasks drene
+        for task_id in task['task_ids'][reported:]:
+            results_queue.put({
+                'status': 'error',
+                'task_id': task_id,
+                'reason': error,
+                'failure': 'error'
+            })
+
+class GenerationQueue:
+    """
+    Cola de prioridad de generación para la GPU.
+    Los reintentos (fallos de QA) se sirven antes que el trabajo nuevo; FIFO dentro de cada prioridad.
+    """
+    RETRY = 0
+    NEW = 1
+    
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()
+    
+    def push(self, job: dict, priority: int = NEW):
+        heapq.heappush(self._heap, (priority, next(self._seq), job))
+    
+    def pop(self) -> dict:
+        return heapq.heappop(self._heap)[2]
+    
+    def pop_batch(self, max_size: int) -> list:
+        """Hasta max_size trabajos en orden de prioridad (variaciones consecutivas del mismo item)."""
+        return [self.pop() for _ in range(min(max_size, len(self._heap)))]
+    
+    def __len__(self):
+        return len(self._heap)
+
+def mutate_prompt(base_prompt: str, item: str, failure: str, retry_count: int) -> str:
+    """Prompt para el reintento N según el motivo de fallo de QA (rota entre mutaciones)."""
+    options = RETRY_PROMPT_MUTATIONS.get(failure, RETRY_PROMPT_MUTATIONS["default"])
+    mutation = options[(retry_count - 1) % len(options)].format(item=item)
+    return f"{mutation}, {base_prompt}"
+
+def build_ai_jobs(biome: str, category: str, item: str, count: int, output_dir: str, gen_config: dict,
+                  palette: tuple = None) -> list:
+    """
+    Trabajos de generación IA de un item (frames para Characters, variaciones para el resto).
+    Cada trabajo lleva su clave de manifiesto y el hash de (prompt + gen_config + paleta del bioma).
+    """
+    jobs = []
+    
+    if category == "Characters":
+        # Cada frame de animación del personaje
+        save_dir = os.path.join(output_dir, biome, category, item.replace(" ", "_"))
+        template = PROMPT_TEMPLATES.get("Characters")
+        
+        for frame_idx, frame_desc in enumerate(CHARACTER_FRAMES):
+            safe_frame_name = frame_desc.replace(" ", "_").replace(",", "")
+            jobs.append({
+                'task_id': f"{biome}_{category}_{item}_frame{frame_idx}",
+                'biome': biome,
+                'category': category,
+                'item': item,
+                'frame_idx': frame_idx,
+                'key': task_key(biome, category, item, f"frame{frame_idx}"),
+                'base_prompt': template.format(item=item, biome=biome, frame=frame_desc),
+                'save_path': os.path.join(save_dir, f"frame_{frame_idx}_{safe_frame_name}.png")
+            })
+        
+        # TODO: Generar sprite sheet y GIF para el personaje
+    else:
+        # Variaciones para otros assets
+        save_dir = os.path.join(output_dir, biome, category)
+        template = PROMPT_TEMPLATES.get(category, PROMPT_TEMPLATES["default"])
+        biome_adj = BIOME_ADJECTIVES.get(biome, "")
+        
+        for var_idx in range(count):
+            jobs.append({
+                'task_id': f"{biome}_{category}_{item}_{var_idx}",
+                'biome': biome,
+                'category': category,
+                'item': item,
+                'var_idx': var_idx,
+                'key': task_key(biome, category, item, f"var{var_idx}"),
+                'base_prompt': template.format(item=item, biome=biome, adjective=biome_adj),
+                'save_path': os.path.join(save_dir, f"{item.replace(' ', '_')}_{var_idx+1}.png")
+            })
+    
+    for job in jobs:
+        job['method'] = 'ai'
+        job['config_hash'] = config_hash(dict(gen_config, prompt=job['base_prompt'], palette=palette))
+        job['prompt'] = job['base_prompt']
+        job['seed'] = None
+        job['retry_count'] = 0
+        job['retry_history'] = []
+    
+    return jobs
+
+def build_procedural_jobs(biome: str, category: str, item: str, count: int, output_dir: str, tile_config: dict,
+                          atlas_path: str = None, quantize_palette: tuple = None) -> list:
+    """
+    Un trabajo por variación de tile procedural (para manifiesto y contabilidad de resultados).
+    Con atlas_path, todas las variaciones se guardan en el atlas del bioma.
+    quantize_palette: paleta fija del bioma usada al cuantizar (None = adaptativa).
+    cache_key identifica el contenido del tile (independiente del modo de salida y de la ruta).
+    """
+    save_dir = os.path.join(output_dir, biome, category)
+    tile_params = {k: v for k, v in tile_config.items() if k != 'atlas'}
+    palette = BIOME_PALETTES.get(biome, BIOME_PALETTES["Forest"])
+    jobs = []
+    for idx in range(count):
+        jobs.append({
+            'task_id': f"{biome}_{category}_{item}_{idx}",
+            'method': 'procedural',
+            'biome': biome,
+            'category': category,
+            'item': item,
+            'key': task_key(biome, category, item, f"var{idx}"),
+            'config_hash': config_hash(dict(tile_config, biome=biome, category=category, item=item, variation=idx,
+                                            quantize_palette=quantize_palette)),
+            'cache_key': config_hash(dict(tile_params, biome=biome, category=category, item=item, variation=idx,
+                                          palette=palette, quantize_palette=quantize_palette)),
+            'save_path': atlas_path or os.path.join(save_dir, f"{item.replace(' ', '_')}_{idx+1}.png")
+        })
+    return jobs
+
+def record_in_catalog(catalog, job: dict, result: dict):
+    """Fila del catálogo SQLite para un asset guardado (datos del trabajo + resultado del escritor)."""
+    metadata = {'config_hash': job['config_hash'], 'attempts': job.get('retry_count', 0) + 1}
+    if result.get('atlas_rect'):
+        metadata['atlas_rect'] = result['atlas_rect']
+        # El atlas se reescribió: los tiles conservados de ejecuciones anteriores tienen el nuevo hash
+        catalog.refresh_file_hash(result['save_path'], result.get('file_hash'))
+    catalog.record(
+        job['key'], result['save_path'],
+        biome=job['biome'],
+        category=job['category'],
+        item=job['item'],
+        variant=job['key'].rsplit('|', 1)[-1],
+        method=job['method'],
+        seed=result.get('seed'),
+        prompt=job.get('prompt'),
+        qa_scores=result.get('qa_scores'),
+        width=result.get('width'),
+        height=result.get('height'),
+        file_hash=result.get('file_hash'),
+        pixel_grid=result.get('pixel_grid'),
+        metadata=metadata
+    )
+
+def drain_results(results_queue, pending_tasks, generation_queue, stats, max_retries, manifest, block=False,
+                  catalog=None):
+    """
+    Procesa los resultados de los workers.
+    - success: tarea completada y registrada en el manifiesto (y en el catálogo SQLite si se indica).
+    - retry/error: se registra el intento y se re-encola con prioridad (nueva seed + prompt mutado)
+      hasta agotar max_retries; después se descarta para que pending_tasks siempre drene.
+    """
+    while True:
+        try:
+            result = results_queue.get(timeout=1) if block else results_queue.get_nowait()
+        except queue.Empty:
+            # Catálogo confirmado en cada pasada: tras un crash no queda por detrás del manifiesto
+            if catalog is not None:
+                catalog.commit()
+            return
+        block = False  # Solo esperar por el primero
+        
+        job = pending_tasks.pop(result['task_id'], None)
+        if job is None:
+            continue
+        
+        if job['method'] == 'procedural':
+            if result['status'] == 'success':
+                stats['completed'] += 1
+                if result.get('cached'):
+                    stats['tile_cache_hits'] += 1
+                else:
+                    stats['generated'] += 1
+                manifest.record(job['key'], job['config_hash'], result['save_path'], method='procedural')
+                if catalog is not None:
+                    record_in_catalog(catalog, job, result)
+            else:
+                # Determinista: regenerar daría el mismo resultado
+                print(f"  ⚠️  Error procedural: {job['task_id']} - {result.get('reason', '')}")
+                stats['exhausted'] += 1
+            continue
+        
+        if result['status'] == 'success':
+            stats['completed'] += 1
+            stats['ai_completed'] += 1
+            matting = result.get('matting')
+            if matting:
+                stats[f"matte_{matting['method']}"] += 1
+                stats[f"matte_{matting['method']}_seconds"] += matting['seconds']
+            manifest.record(
+                job['key'], job['config_hash'], result['save_path'],
+                seed=result.get('seed'),
+                qa_scores=result.get('qa_scores'),
+                method='ai',
+                attempts=job['retry_count'] + 1,
+                pixel_grid=result.get('pixel_grid')
+            )
+            if catalog is not None:
+                record_in_catalog(catalog, job, result)
+            continue
+        
+        # Fallo (QA o error del worker): registrar historial
+        failure = result.get('failure') or 'error'
+        if result.get('stage') == 'prefilter':
+            stats['prefiltered'] += 1
+        job['retry_history'].append({
+            'attempt': job['retry_count'] + 1,
+            'seed': job['seed'],
+            'prompt': job['prompt'],
+            'failure': failure,
+            'reason': result.get('reason', '')
+        })
+        job['retry_count'] += 1
+        
+        if job['retry_count'] <= max_retries:
+            print(f"  🔄 Retry {job['retry_count']}/{max_retries}: {job['task_id']} ({failure})")
+            job['prompt'] = mutate_prompt(job['base_prompt'], job['item'], failure, job['retry_count'])
+            job['seed'] = None  # Nueva seed aleatoria
+            stats['retried'] += 1
+            generation_queue.push(job, GenerationQueue.RETRY)
+        else:
+            print(f"  ⚠️  Max retries alcanzado: {job['task_id']}")
+            stats['exhausted'] += 1
 
 def main():
     parser = argparse.ArgumentParser(description="Generador con Colas Retroalimentativas")
@@ -113,10 +504,37 @@ def main():
     parser.add_argument("--style_strength", type=float, default=0.6, help="Fuerza del estilo IP-Adapter")
     parser.add_argument("--no_quantize", action="store_true", help="Desactivar paleta")
     parser.add_argument("--no_outline", action="store_true", help="Desactivar outline")
+    parser.add_argument("--palette", type=str, default="biome", choices=["biome", "adaptive"],
+                        help="Cuantización: paleta fija de 32 colores por bioma o paleta adaptativa por imagen")
     parser.add_argument("--min_clip_score", type=float, default=70.0, help="Score mínimo CLIP (0-100)")
     parser.add_argument("--min_aesthetic", type=float, default=6.0, help="Score mínimo estético (0-10)")
     parser.add_argument("--max_retries", type=int, default=3, help="Máximo de reintentos por imagen")
-    parser.add_argument("--cpu_workers", type=int, default=30, help="Workers CPU para evaluación")
+    parser.add_argument("--gpu_batch", type=int, default=4, help="Imágenes por llamada al pipeline SDXL (ajustar a la VRAM)")
+    parser.add_argument("--no_resume", action="store_true", help="Ignorar el manifiesto y regenerar todo")
+    parser.add_argument("--atlas", action="store_true", help="Tiles procedurales como un atlas PNG + índice JSON por bioma")
+    parser.add_argument("--tile_cache", type=str, default=".tile_cache", help="Carpeta de la caché de tiles procedurales")
+    parser.add_argument("--tile_cache_mb", type=int, default=512, help="Tamaño máximo de la caché de tiles (MB, expulsión LRU)")
+    parser.add_argument("--tile_cache_mode", type=str, default="hardlink", choices=TileCache.MODES,
+                        help="Cómo se materializan los tiles en caché en la salida")
+    parser.add_argument("--no_tile_cache", action="store_true", help="Desactivar la caché de tiles procedurales")
+    parser.add_argument("--procedural_workers", type=int, default=4, help="Workers CPU para tiles procedurales (en paralelo con la GPU)")
+    parser.add_argument("--cpu_workers", type=int, default=30, help="Workers CPU para post-procesado")
+    parser.add_argument("--rembg_threads", type=int, default=None, help="Hilos intra-op de ONNX Runtime por sesión rembg (default: núcleos / cpu_workers)")
+    parser.add_argument("--rembg_inter_threads", type=int, default=1, help="Hilos inter-op de ONNX Runtime por sesión rembg")
+    parser.add_argument("--rembg_sessions", type=int, default=1, help="Sesiones rembg por worker CPU (pool por proceso)")
+    parser.add_argument("--no_catalog", action="store_true", help="No registrar los assets en el catálogo SQLite")
+    parser.add_argument("--writers", type=int, default=1, help="Procesos escritores de PNG y metadata")
+    parser.add_argument("--png_compress", type=int, default=6, choices=range(10), metavar="[0-9]", help="Nivel de compresión PNG (0 = más rápido)")
+    parser.add_argument("--metadata_fsync", type=float, default=5.0, help="Segundos entre fsync de los JSONL de metadata")
+    parser.add_argument("--no_native_res", action="store_true", help="Guardar a la resolución generada (sin bajar a la rejilla de pixel nativa)")
+    parser.add_argument("--no_prefilter", action="store_true", help="Enviar todas las imágenes a CLIP (sin pre-filtro NumPy)")
+    parser.add_argument("--no_fast_matting", action="store_true", help="Usar siempre rembg (sin matting rápido de fondo blanco)")
+    parser.add_argument("--matting_confidence", type=float, default=0.85, help="Confianza mínima del matting rápido (si no, rembg)")
+    parser.add_argument("--qa_workers", type=int, default=2, help="Procesos del servicio QA (cada uno carga CLIP-Large una vez)")
+    parser.add_argument("--qa_batch_size", type=int, default=8, help="Tamaño máximo de micro-batch del servicio QA")
+    parser.add_argument("--qa_max_wait_ms", type=float, default=50.0, help="Espera máxima (ms) para llenar un micro-batch QA")
+    parser.add_argument("--shm_slots", type=int, default=64, help="Slots de imagen en memoria compartida (GPU → CPU)")
+    parser.add_argument("--qa_threads", type=int, default=None, help="Hilos de torch por proceso QA (default: núcleos / qa_workers)")
     
     args = parser.parse_args()
     
@@ -125,57 +543,96 @@ def main():
     
     ensure_dir(args.output)
     
+    # Parámetros que determinan el contenido de cada asset (entran en el hash del manifiesto)
+    gen_config = {
+        'steps': 50,        # Aumentado para mejor calidad
+        'cfg': 7.5,         # Más fiel al prompt
+        'width': 768,
+        'height': 768,
+        'style_strength': args.style_strength,
+        'quantize': apply_quantize,
+        'outline': apply_outline,
+        'native_res': not args.no_native_res
+    }
+    tile_config = {'tile_size': 32, 'quantize': apply_quantize, 'outline': apply_outline, 'atlas': args.atlas,
+                   'generator_version': GENERATOR_VERSION}
+    
+    # Manifiesto de la ejecución (permite reanudar tras un crash)
+    manifest = RunManifest(os.path.join(args.output, "manifest.jsonl"))
+    resume = not args.no_resume
+    if resume and manifest.entries:
+        print(f"♻️  Reanudando: {len(manifest.entries)} entradas en el manifiesto")
+    
+    # Catálogo consultable de lo producido (se rellena a medida que llegan los resultados)
+    catalog = None if args.no_catalog else AssetCatalog(catalog_path(args.output))
+    if catalog is not None:
+        reconciled = reconcile_manifest(catalog, manifest.entries)
+        if reconciled:
+            print(f"📚 Catálogo: {reconciled} assets del manifiesto que faltaban, añadidos")
+    
     print("🚀 Iniciando Generador con Colas Retroalimentativas")
     print(f"   GPU: Generación continua")
-    print(f"   CPU: {args.cpu_workers} workers evaluando en paralelo")
+    print(f"   CPU: {args.cpu_workers} workers de post-procesado en paralelo")
+    print(f"   QA: {args.qa_workers} procesos de servicio compartidos")
     print(f"   QA: CLIP ≥ {args.min_clip_score}, Aesthetic ≥ {args.min_aesthetic}")
     print(f"   Retries: Máximo {args.max_retries} por imagen")
     print("")
     
-    # Cargar generador (GPU)
-    generator = PixelArtGenerator()
-    generator.load_model()
-    
-    # Cargar estilo
-    style_image = None
-    if os.path.exists("style_reference.png"):
-        style_image = Image.open("style_reference.png").convert("RGB")
-        print(f"✅ Estilo cargado (fuerza: {args.style_strength})")
-    
     # Preparar biomas y categorías
     biomes_to_process = BIOMES if args.biome == "all" else [args.biome]
     categories_to_process = ASSETS.keys() if args.category == "all" else [args.category]
     
+    # Paleta fija por bioma (de BIOME_PALETTES + imagen de estilo), guardada junto a sus assets
+    style_path = "style_reference.png" if os.path.exists("style_reference.png") else None
+    biome_palettes = {}
+    if apply_quantize and args.palette == "biome":
+        for biome in biomes_to_process:
+            biome_palettes[biome] = biome_palette(biome, num_colors=32, style_image_path=style_path)
+            ensure_dir(os.path.join(args.output, biome))
+            save_palette(biome_palettes[biome], os.path.join(args.output, biome, "palette.json"))
+        print(f"🎨 Paleta fija por bioma ({len(biome_palettes)} biomas, 32 colores)")
+    
     # Crear colas
-    task_queue = Queue(maxsize=200)  # Cola de procesamiento
-    results_queue = Queue()
+    task_queue = Queue(maxsize=200)  # Cola de procesamiento (solo índices de slot + metadata)
+    results_queue = Queue()          # Resultados de workers IA y procedurales
+    procedural_queue = Queue()       # Items procedurales (pool propio, en paralelo con la GPU)
     
-    # Iniciar workers CPU
-    print(f"🔧 Iniciando {args.cpu_workers} workers CPU...")
-    workers = []
-    for _ in range(args.cpu_workers):
+    # Caché de tiles procedurales (compartida entre ejecuciones y subconjuntos de biomas)
+    tile_cache = None
+    if not args.no_tile_cache:
+        tile_cache = TileCache(args.tile_cache, max_bytes=args.tile_cache_mb * 1024 * 1024, mode=args.tile_cache_mode)
+        print(f"🗄️  Caché de tiles: {args.tile_cache} ({args.tile_cache_mode}, máx {args.tile_cache_mb} MB)")
+    
+    # Escritor asíncrono: los workers encolan PNG + metadata y siguen trabajando
+    writer = AssetWriter(results_queue, num_writers=args.writers, compress_level=args.png_compress,
+                         fsync_interval=args.metadata_fsync, tile_cache=tile_cache)
+    writer.start()
+    print(f"💾 Escritor asíncrono: {args.writers} proceso(s), PNG nivel {args.png_compress}, "
+          f"fsync de metadata cada {args.metadata_fsync:.0f}s")
+    
+    # Iniciar pool procedural ANTES de cargar SDXL: los tiles avanzan desde el primer segundo
+    print(f"🧱 Iniciando {args.procedural_workers} workers procedurales...")
+    procedural_workers = []
+    for _ in range(args.procedural_workers):
         p = Process(
-            target=process_and_save_worker,
-            args=(task_queue, results_queue, apply_quantize, apply_outline, args.min_clip_score, args.min_aesthetic)
+            target=procedural_worker,
+            args=(procedural_queue, results_queue, writer.client(), apply_quantize, apply_outline, tile_cache)
         )
         p.start()
-        workers.append(p)
+        procedural_workers.append(p)
     
-    print("✅ Workers listos\n")
-    
-    # Tracking
-    manager = Manager()
-    pending_tasks = manager.dict()  # {task_id: {retry_count, ...}}
-    completed_count = manager.Value('i', 0)
-    total_generated = manager.Value('i', 0)
+    # Tracking (solo el proceso principal lo modifica)
+    stats = {'generated': 0, 'completed': 0, 'ai_generated': 0, 'ai_completed': 0, 'skipped': 0, 'retried': 0, 'exhausted': 0, 'tile_cache_hits': 0,
+             'gpu_seconds': 0.0, 'prefiltered': 0, 'matte_fast': 0, 'matte_rembg': 0, 'matte_fast_seconds': 0.0, 'matte_rembg_seconds': 0.0}
+    pending_tasks = {}  # En vuelo (generadas, esperando resultado): {task_id: job}
+    generation_queue = GenerationQueue()
     
-    # Loop principal de generación
+    # Catálogo de trabajo: procedural al pool CPU, IA a la cola de la GPU
+    procedural_count = 0
     for biome in biomes_to_process:
-        gc.collect()
-        torch.cuda.empty_cache()
-        print(f"--- Bioma: {biome} ---")
-        
-        biome_adj = BIOME_ADJECTIVES.get(biome, "")
+        palette = biome_palettes.get(biome)
+        atlas_path = atlas_paths(args.output, biome)[0] if args.atlas else None
+        atlas_items = []  # Modo atlas: items procedurales del bioma (se generan juntos)
         
         for category in categories_to_process:
             if category not in ASSETS:
@@ -183,231 +640,245 @@ def main():
             
             items = ASSETS[category]
             for item in items:
-                print(f"\n📦 {item} ({biome})")
-                
                 # ==== ROUTING HÍBRIDO: PROCEDURAL vs IA ====
                 if category in PROCEDURAL_CATEGORIES:
-                    # ✨ GENERACIÓN PROCEDURAL (tiles, caminos)
-                    print(f"  🔧 Generación procedural (rápida, tileable garantizado)")
+                    # ✨ GENERACIÓN PROCEDURAL (tiles, caminos): no necesita QA con IA
+                    tile_jobs = build_procedural_jobs(biome, category, item, args.count, args.output, tile_config,
+                                                      atlas_path=atlas_path, quantize_palette=palette)
+                    if args.atlas:
+                        atlas_items.append((category, item, tile_jobs))
+                        continue
                     
-                    tile_gen = TileGenerator(tile_size=32)
-                    procedural_images = tile_gen.generate_batch(category, item, biome, count=args.count)
+                    if resume and all(manifest.is_done(job['key'], job['config_hash']) for job in tile_jobs):
+                        stats['skipped'] += len(tile_jobs)
+                        continue
                     
-                    # Guardar tiles procedurales directamente (no necesitan QA con IA)
-                    save_dir = os.path.join(args.output, biome, category)
-                    ensure_dir(save_dir)
+                    for job in tile_jobs:
+                        pending_tasks[job['task_id']] = job
                     
-                    for idx, tile_img in enumerate(procedural_images):
-                        filename = f"{item.replace(' ', '_')}_{idx+1}.png"
-                        save_path = os.path.join(save_dir, filename)
-                        
-                        # Post-procesado opcional
-                        if apply_quantize:
-                            tile_img = quantize_colors(tile_img, num_colors=32)
-                        if apply_outline:
-                            tile_img = add_pixel_outline(tile_img)
-                        
-                        tile_img.save(save_path)
-                        
-                        # Guardar metadata simple
-                        meta_dir = os.path.join(save_dir, "metadata")
-                        ensure_dir(meta_dir)
-                        meta_path = os.path.join(meta_dir, filename.replace('.png', '.json'))
-                        
-                        metadata = {
-                            'method': 'procedural',
-                            'biome': biome,
-                            'category': category,
-                            'item': item,
-                            'variation': idx + 1,
-                            'tileable': True
-                        }
-                        
-                        with open(meta_path, 'w') as f:
-                            json.dump(metadata, f, indent=2)
-                        
-                        total_generated.value += 1
-                        completed_count.value += 1
-                    
-                    print(f"  ✅ {len(procedural_images)} tiles procedurales generados")
+                    procedural_queue.put({
+                        'biome': biome,
+                        'category': category,
+                        'item': item,
+                        'tile_size': tile_config['tile_size'],
+                        'task_ids': [job['task_id'] for job in tile_jobs],
+                        'save_paths': [job['save_path'] for job in tile_jobs],
+                        'cache_keys': [job['cache_key'] for job in tile_jobs],
+                        'palette': palette,
+                        'metadata_log': metadata_log_path(args.output, biome)
+                    })
+                    procedural_count += len(tile_jobs)
                     continue  # Saltar el resto (no usar IA)
                 
                 # ==== GENERACIÓN CON IA (objetos complejos) ====
-                # Manejo especial para Characters (con frames de animación)
-                if category == "Characters":
-                    # Generar cada frame del personaje
-                    for frame_idx, frame_desc in enumerate(CHARACTER_FRAMES):
-                        task_id = f"{biome}_{category}_{item}_frame{frame_idx}"
-                        
-                        pending_tasks[task_id] = {
-                            'retry_count': 0,
-                            'biome': biome,
-                            'category': category,
-                            'item': item,
-                            'frame_idx': frame_idx
-                        }
-                        
-                        # Generar imagen del frame
-                        template = PROMPT_TEMPLATES.get("Characters")
-                        prompt = template.format(item=item, biome=biome, frame=frame_desc)
-                        
-                        print(f"  🎨 Generando frame {frame_idx+1}/{len(CHARACTER_FRAMES)}: {frame_desc[:30]}...")
-                        
-                        images, meta = generator.generate(
-                            prompt=prompt,
-                            num_inference_steps=50,  # Aumentado para mejor calidad
-                            guidance_scale=7.5,      # Más fiel al prompt
-                            width=768,
-                            height=768,
-                            num_images=1,
-                            ip_adapter_image=style_image,
-                            ip_adapter_scale=args.style_strength
-                        )
-                        
-                        total_generated.value += 1
-                        
-                        # Preparar tarea para evaluación
-                        save_dir = os.path.join(args.output, biome, category, item.replace(" ", "_"))
-                        ensure_dir(save_dir)
-                        safe_frame_name = frame_desc.replace(" ", "_").replace(",", "")
-                        filename = f"frame_{frame_idx}_{safe_frame_name}.png"
-                        save_path = os.path.join(save_dir, filename)
-                        
-                        task = {
-                            'task_id': task_id,
-                            'image': images[0],
-                            'save_path': save_path,
-                            'prompt': prompt,
-                            'metadata': meta
-                        }
-                        
-                        # Encolar para evaluación
-                        task_queue.put(task)
-                        
-                        # Procesar resultados mientras generamos
-                        while not results_queue.empty():
-                            result = results_queue.get_nowait()
-                            result_task_id = result['task_id']
-                            
-                            if result['status'] == 'success':
-                                completed_count.value += 1
-                                if result_task_id in pending_tasks:
-                                    del pending_tasks[result_task_id]
-                                
-                            elif result['status'] == 'retry':
-                                task_info = pending_tasks.get(result_task_id)
-                                if task_info:
-                                    task_info['retry_count'] += 1
-                                    
-                                    if task_info['retry_count'] < args.max_retries:
-                                        print(f"  🔄 Retry {task_info['retry_count']}/{args.max_retries}: {result_task_id}")
-                                        # TODO: Re-generar
-                                    else:
-                                        print(f"  ⚠️  Max retries alcanzado: {result_task_id}")
-                                        del pending_tasks[result_task_id]
-                    
-                    # TODO: Generar sprite sheet y GIF para el personaje
-                    
-                else:
-                    # Generar variaciones para otros assets
-                    for var_idx in range(args.count):
-                        task_id = f"{biome}_{category}_{item}_{var_idx}"
-                        
-                        # Inicializar tracking
-                        pending_tasks[task_id] = {
-                            'retry_count': 0,
-                            'biome': biome,
-                            'category': category,
-                            'item': item,
-                            'var_idx': var_idx
-                        }
-                        
-                        # Generar imagen
-                        template = PROMPT_TEMPLATES.get(category, PROMPT_TEMPLATES["default"])
-                        prompt = template.format(item=item, biome=biome, adjective=biome_adj)
-                        
-                        print(f"  🎨 Generando variación {var_idx+1}/{args.count}...")
-                        
-                        images, meta = generator.generate(
-                            prompt=prompt,
-                            num_inference_steps=50,  # Aumentado para mejor calidad
-                            guidance_scale=7.5,      # Más fiel al prompt
-                            width=768,
-                            height=768,
-                            num_images=1,
-                            ip_adapter_image=style_image,
-                            ip_adapter_scale=args.style_strength
-                        )
-                        
-                        total_generated.value += 1
-                        
-                        # Preparar tarea para evaluación
-                        save_dir = os.path.join(args.output, biome, category)
-                        ensure_dir(save_dir)
-                        filename = f"{item.replace(' ', '_')}_{var_idx+1}.png"
-                        save_path = os.path.join(save_dir, filename)
-                        
-                        task = {
-                            'task_id': task_id,
-                            'image': images[0],
-                            'save_path': save_path,
-                            'prompt': prompt,
-                            'metadata': meta
-                        }
-                        
-                        # Encolar para evaluación
-                        task_queue.put(task)
-                        
-                        # Procesar resultados mientras generamos
-                        while not results_queue.empty():
-                            result = results_queue.get_nowait()
-                            result_task_id = result['task_id']
-                            
-                            if result['status'] == 'success':
-                                completed_count.value += 1
-                                if result_task_id in pending_tasks:
-                                    del pending_tasks[result_task_id]
-                                
-                            elif result['status'] == 'retry':
-                                task_info = pending_tasks.get(result_task_id)
-                                if task_info:
-                                    task_info['retry_count'] += 1
-                                    
-                                    if task_info['retry_count'] < args.max_retries:
-                                        print(f"  🔄 Retry {task_info['retry_count']}/{args.max_retries}: {result_task_id}")
-                                        # TODO: Re-generar
-                                    else:
-                                        print(f"  ⚠️  Max retries alcanzado: {result_task_id}")
-                                        del pending_tasks[result_task_id]
-                
-                # Limpiar memoria cada item
-                if total_generated.value % 10 == 0:
-                    gc.collect()
-                    torch.cuda.empty_cache()
-    
-    # Esperar a que se procesen todas las tareas pendientes
-    print("\n⏳ Esperando a que terminen las evaluaciones...")
-    while len(pending_tasks) > 0:
-        time.sleep(1)
-        while not results_queue.empty():
-            result = results_queue.get_nowait()
-            if result['status'] == 'success':
-                completed_count.value += 1
-                if result['task_id'] in pending_tasks:
-                    del pending_tasks[result['task_id']]
+                for job in build_ai_jobs(biome, category, item, args.count, args.output, gen_config, palette=palette):
+                    if resume and manifest.is_done(job['key'], job['config_hash']):
+                        stats['skipped'] += 1
+                        continue
+                    generation_queue.push(job)
+        
+        # Modo atlas: el PNG del bioma se escribe entero, así que se salta o se regenera completo
+        if atlas_items:
+            atlas_jobs = [job for _, _, tile_jobs in atlas_items for job in tile_jobs]
+            if resume and all(manifest.is_done(job['key'], job['config_hash']) for job in atlas_jobs):
+                stats['skipped'] += len(atlas_jobs)
+                continue
+            
+            for job in atlas_jobs:
+                pending_tasks[job['task_id']] = job
+            
+            procedural_queue.put({
+                'atlas': True,
+                'biome': biome,
+                'tile_size': tile_config['tile_size'],
+                'count': args.count,
+                'atlas_path': atlas_path,
+                'palette': palette,
+                'items': [
+                    {'category': category, 'item': item, 'task_ids': [job['task_id'] for job in tile_jobs]}
+                    for category, item, tile_jobs in atlas_items
+                ]
+            })
+            procedural_count += len(atlas_jobs)
+    
+    print(f"   🔧 {procedural_count} tiles procedurales en cola")
+    
+    # Cargar generador (GPU) + embeddings de estilo (codificados una sola vez).
+    # torch/diffusers se importan aquí: los procesos hijos (spawn) re-importan este módulo
+    # y no deben pagar la carga de torch.
+    import torch
+    from pixel_engine import PixelArtGenerator
+    
+    generator = PixelArtGenerator()
+    generator.load_model(style_image_path=style_path)
+    
+    if generator.style_embeds is not None:
+        print(f"✅ Estilo cargado (fuerza: {args.style_strength})")
+    
+    # Ring de imágenes en memoria compartida (la GPU espera si no hay slots libres)
+    image_ring = SharedImageRing(num_slots=args.shm_slots, width=768, height=768)
+    
+    # Iniciar servicio QA compartido (modelos cargados una sola vez por proceso de servicio)
+    print(f"🔍 Iniciando servicio QA ({args.qa_workers} procesos)...")
+    qa_service = QAService(
+        num_clients=args.cpu_workers,
+        num_services=args.qa_workers,
+        min_clip_score=args.min_clip_score,
+        min_aesthetic=args.min_aesthetic,
+        threads_per_service=args.qa_threads,
+        max_batch_size=args.qa_batch_size,
+        max_wait_ms=args.qa_max_wait_ms,
+        image_ring=image_ring
+    )
+    qa_service.start()
+    
+    # Presupuesto de hilos de rembg: workers * sesiones * hilos ≈ núcleos disponibles
+    cpu_count = os.cpu_count() or 1
+    rembg_threads = args.rembg_threads or max(1, cpu_count // max(1, args.cpu_workers * args.rembg_sessions))
+    rembg_config = {
+        'intra_op_threads': rembg_threads,
+        'inter_op_threads': args.rembg_inter_threads,
+        'pool_size': args.rembg_sessions
+    }
+    rembg_total = args.cpu_workers * args.rembg_sessions * rembg_threads
+    print(f"✂️  rembg: {args.rembg_sessions} sesión(es) x {rembg_threads} hilo(s) por worker ({rembg_total} hilos / {cpu_count} núcleos)")
+    if rembg_total > cpu_count:
+        print("   ⚠️  Sobresuscripción de CPU: reducir --cpu_workers, --rembg_sessions o --rembg_threads")
+    
+    matting_config = {'fast_matting': not args.no_fast_matting, 'min_confidence': args.matting_confidence}
+    
+    # Iniciar workers CPU
+    print(f"🔧 Iniciando {args.cpu_workers} workers CPU...")
+    workers = []
+    for worker_idx in range(args.cpu_workers):
+        p = Process(
+            target=process_and_save_worker,
+            args=(task_queue, results_queue, qa_service.client(worker_idx), image_ring, writer.client(),
+                  apply_quantize, apply_outline,
+                  rembg_config, matting_config, not args.no_prefilter,
+                  not args.no_native_res)
+        )
+        p.start()
+        workers.append(p)
+    
+    print("✅ Workers listos\n")
+    
+    # Loop principal de generación (GPU): reintentos primero, luego trabajo nuevo.
+    # Termina cuando no queda nada por generar ni resultados por recibir.
+    print(f"\n🎨 {len(generation_queue)} imágenes IA en cola ({stats['skipped']} assets ya completos en el manifiesto)")
+    current_biome = None
+    
+    while generation_queue or pending_tasks:
+        # Procesar resultados; si no hay nada que generar, esperar al siguiente
+        drain_results(results_queue, pending_tasks, generation_queue, stats, args.max_retries, manifest,
+                      block=not generation_queue, catalog=catalog)
+        
+        if not generation_queue:
+            continue
+        
+        # Batch de GPU: reintentos primero, luego variaciones/items consecutivos
+        batch = generation_queue.pop_batch(args.gpu_batch)
+        
+        if batch[0]['biome'] != current_biome:
+            current_biome = batch[0]['biome']
+            gc.collect()
+            torch.cuda.empty_cache()
+            print(f"--- Bioma (GPU): {current_biome} ---")
+        
+        for job in batch:
+            label = f"reintento {job['retry_count']}/{args.max_retries}" if job['retry_count'] else "nuevo"
+            print(f"  🎨 Generando {job['task_id']} ({label})...")
+        
+        start = time.time()
+        images, metas = generator.generate(
+            prompt=[job['prompt'] for job in batch],
+            num_inference_steps=gen_config['steps'],
+            guidance_scale=gen_config['cfg'],
+            width=gen_config['width'],
+            height=gen_config['height'],
+            seeds=[job['seed'] for job in batch],
+            ip_adapter_scale=args.style_strength
+        )
+        stats['gpu_seconds'] += time.time() - start
+        stats['generated'] += len(batch)
+        stats['ai_generated'] += len(batch)
+        
+        for job, image, meta in zip(batch, images, metas):
+            job['seed'] = meta['seed']
+            meta['attempt'] = job['retry_count'] + 1
+            meta['retry_history'] = list(job['retry_history'])
+            
+            # Preparar tarea para evaluación (los directorios los crea el escritor)
+            slot = image_ring.acquire()
+            image_ring.write(slot, image)
+            
+            task = {
+                'task_id': job['task_id'],
+                'slot': slot,
+                'save_path': job['save_path'],
+                'prompt': job['base_prompt'],  # QA siempre contra el prompt original
+                'metadata': meta,
+                'palette': biome_palettes.get(job['biome']),
+                'metadata_log': metadata_log_path(args.output, job['biome'])
+            }
+            
+            # Encolar para evaluación
+            pending_tasks[job['task_id']] = job
+            task_queue.put(task)
+        
+        # Limpiar memoria periódicamente
+        if stats['ai_generated'] % 10 < len(batch):
+            gc.collect()
+            torch.cuda.empty_cache()
     
     # Terminar workers
     print("🛑 Terminando workers...")
     for _ in range(args.cpu_workers):
         task_queue.put(None)
+    for _ in range(args.procedural_workers):
+        procedural_queue.put(None)
     
-    for w in workers:
+    for w in workers + procedural_workers:
         w.join()
     
+    writer.stop()  # Vacía las escrituras pendientes y hace fsync de la metadata
+    qa_service.stop()
+    image_ring.close()
+    image_ring.unlink()
+    manifest.close()
+    if catalog is not None:
+        catalog.close()
+    
+    # Expulsión LRU al terminar (un solo proceso: sin carreras con los workers)
+    if tile_cache is not None:
+        evicted = tile_cache.trim()
+        if evicted:
+            print(f"🗄️  Caché de tiles: {evicted} entradas expulsadas")
+    
+    embed_stats = generator.cache_stats()
+    
     print(f"\n✅ Generación completada!")
-    print(f"   Total generadas: {total_generated.value}")
-    print(f"   Total guardadas: {completed_count.value}")
-    print(f"   Tasa de aprobación: {(completed_count.value/total_generated.value*100):.1f}%")
+    print(f"   Total generadas: {stats['generated']}")
+    print(f"   Total guardadas: {stats['completed']}")
+    print(f"   Saltadas (ya completas): {stats['skipped']}")
+    print(f"   Tiles desde caché: {stats['tile_cache_hits']}")
+    print(f"   Reintentos: {stats['retried']} (descartadas tras {args.max_retries}: {stats['exhausted']})")
+    print(f"   Rechazadas por el pre-filtro (sin CLIP): {stats['prefiltered']}")
+    if stats['ai_generated']:
+        # Solo IA: los tiles procedurales (y los de la caché) no pasan por QA ni por la GPU
+        print(f"   Tasa de aprobación QA (IA): {(stats['ai_completed']/stats['ai_generated']*100):.1f}%")
+    if stats['gpu_seconds']:
+        print(f"   Assets aceptados por hora de GPU: {stats['ai_completed'] / (stats['gpu_seconds'] / 3600):.0f}")
+    matted = stats['matte_fast'] + stats['matte_rembg']
+    if matted:
+        print(f"   Matting: {stats['matte_fast']} rápido / {stats['matte_rembg']} rembg "
+              f"(fallback {stats['matte_rembg'] / matted * 100:.1f}%)")
+        if stats['matte_fast'] and stats['matte_rembg']:
+            # Estimación: cada imagen resuelta por la vía rápida habría costado el tiempo medio de rembg
+            rembg_avg = stats['matte_rembg_seconds'] / stats['matte_rembg']
+            saved = stats['matte_fast'] * rembg_avg - stats['matte_fast_seconds']
+            print(f"   Tiempo CPU ahorrado en matting: ~{saved / 60:.1f} min (rembg medio {rembg_avg:.2f}s/img)")
+    print(f"   Caché de embeddings: {embed_stats['hits']} hits / {embed_stats['misses']} misses ({embed_stats['hit_rate']*100:.1f}%)")
 
 if __name__ == "__main__":
     # Necesario para multiprocessing en algunos sistemas
@@ -0,0 +1,261 @@
+"""
+Benchmarks de rendimiento del pipeline
+Uso:
+    python benchmark.py qa --images 32
+    python benchmark.py terrain --sizes 32 64 128
+    python benchmark.py palette --images 16
+    python benchmark.py outline --size 768
+    python benchmark.py native --images 8
+"""
+import argparse
+import random
+import time
+import numpy as np
+from PIL import Image
+
+def _synthetic_images(count: int, size: int = 768, seed: int = 0) -> list:
+    """Imágenes sintéticas tipo sprite: bloques de color sobre fondo blanco."""
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        small = rng.integers(0, 256, size=(size // 8, size // 8, 3), dtype=np.uint8)
+        small[:size // 32, :] = 255
+        small[-size // 32:, :] = 255
+        images.append(Image.fromarray(small).resize((size, size), Image.NEAREST))
+    return images
+
+def bench_qa(args):
+    """Imágenes/segundo del evaluador CLIP en CPU para distintos tamaños de batch."""
+    from qa_evaluator import init_advanced_qa, evaluate_batch
+
+    init_advanced_qa(device="cpu")
+
+    images = _synthetic_images(args.images)
+    prompts = ["single oak tree in Forest style"] * len(images)
+
+    # Calentamiento (también llena la caché de embeddings de texto)
+    evaluate_batch(images[:1], prompts[:1])
+
+    print(f"{'batch':>6} | {'img/s':>8} | {'s/img':>8}")
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        for i in range(0, len(images), batch_size):
+            evaluate_batch(images[i:i + batch_size], prompts[i:i + batch_size])
+        elapsed = time.perf_counter() - start
+        print(f"{batch_size:>6} | {len(images) / elapsed:>8.2f} | {elapsed / len(images):>8.3f}")
+
+def _terrain_tile_loop(tile_gen, terrain_type: str, biome: str, variation: int = 0) -> Image.Image:
+    """Implementación original de generate_terrain_tile (doble bucle por pixel), como referencia."""
+    from procedural_tiles import perlin_noise_seamless
+
+    img = Image.new("RGBA", (tile_gen.tile_size, tile_gen.tile_size), (0, 0, 0, 0))
+    pixels = img.load()
+    palette = tile_gen.get_palette(biome, terrain_type)
+    noise = perlin_noise_seamless((tile_gen.tile_size, tile_gen.tile_size), scale=8.0, octaves=3, seed=variation)
+
+    for y in range(tile_gen.tile_size):
+        for x in range(tile_gen.tile_size):
+            color_idx = int(noise[y, x] * (len(palette) - 1))
+            pixels[x, y] = palette[color_idx] + (255,)
+
+    random.seed(variation)
+    detail_color = (max(0, palette[0][0] - 30), max(0, palette[0][1] - 30), max(0, palette[0][2] - 30), 255)
+    for _ in range(tile_gen.tile_size // 8):
+        x = random.randint(0, tile_gen.tile_size - 1)
+        y = random.randint(0, tile_gen.tile_size - 1)
+        pixels[x, y] = detail_color
+
+    return img
+
+def bench_terrain(args):
+    """Tile de terreno: doble bucle original vs lookup de paleta vectorizado."""
+    from procedural_tiles import TileGenerator
+
+    print(f"{'size':>6} | {'loop ms':>9} | {'numpy ms':>9} | {'speedup':>8} | idéntico")
+    for size in args.sizes:
+        tile_gen = TileGenerator(tile_size=size)
+
+        start = time.perf_counter()
+        reference = [_terrain_tile_loop(tile_gen, "grass tile", "Forest", v) for v in range(args.variations)]
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fast = [tile_gen.generate_terrain_tile("grass tile", "Forest", v) for v in range(args.variations)]
+        fast_time = time.perf_counter() - start
+
+        identical = all(np.array_equal(np.asarray(a), np.asarray(b)) for a, b in zip(reference, fast))
+        print(f"{size:>6} | {loop_time / args.variations * 1000:>9.2f} | {fast_time / args.variations * 1000:>9.2f} | "
+              f"{loop_time / fast_time:>7.1f}x | {identical}")
+
+def bench_palette(args):
+    """Cuantización: octree de PIL por imagen vs paleta fija del bioma con LUT 3D."""
+    from image_utils import quantize_colors
+    from palette_engine import biome_palette, apply_palette
+    from procedural_tiles import BIOME_PALETTES
+
+    images = [image.convert("RGBA") for image in _synthetic_images(args.images, size=args.size)]
+    palette = biome_palette("Forest")
+
+    # Calentamiento (construye la LUT de la paleta)
+    quantize_colors(images[0], palette=palette)
+
+    start = time.perf_counter()
+    for image in images:
+        quantize_colors(image, num_colors=32)
+    octree_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    mapped = [quantize_colors(image, palette=palette) for image in images]
+    lut_time = time.perf_counter() - start
+
+    shared = all(set(image.convert("RGB").getdata()) <= set(palette) for image in mapped)
+    print(f"{'método':>8} | {'ms/img':>8}")
+    print(f"{'octree':>8} | {octree_time / len(images) * 1000:>8.2f}")
+    print(f"{'lut':>8} | {lut_time / len(images) * 1000:>8.2f}")
+    print(f"speedup: {octree_time / lut_time:.1f}x | paleta compartida: {shared}")
+
+    # Cada color de cada paleta de bioma debe mapearse a sí mismo (tiles procedurales exactos)
+    stable = True
+    for biome in BIOME_PALETTES:
+        palette = biome_palette(biome)
+        colors = np.array(palette, dtype=np.uint8)
+        changed = (apply_palette(colors, palette) != colors).any(axis=-1)
+        if changed.any():
+            stable = False
+            print(f"❌ {biome}: colores que no se mapean a sí mismos: {[tuple(c) for c in colors[changed].tolist()]}")
+    print(f"paletas de bioma estables: {stable}")
+
+def _outline_affine(image: Image.Image, color: tuple = (0, 0, 0)) -> Image.Image:
+    """Implementación original de add_pixel_outline (8 desplazamientos AFFINE), como referencia."""
+    outline_mask = Image.new("L", image.size, 0)
+    alpha_layer = image.split()[3]
+    offsets = [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
+
+    for ox, oy in offsets:
+        shifted = alpha_layer.transform(alpha_layer.size, Image.AFFINE, (1, 0, -ox, 0, 1, -oy))
+        outline_mask = Image.fromarray(np.maximum(np.array(outline_mask), np.array(shifted)))
+
+    outline_layer = Image.new("RGBA", image.size, color + (255,))
+    outline_layer.putalpha(outline_mask)
+    return Image.alpha_composite(outline_layer, image)
+
+def _synthetic_sprites(count: int, size: int, seed: int = 0) -> list:
+    """Sprites RGBA sintéticos: bloques de color sobre fondo transparente."""
+    rng = np.random.default_rng(seed)
+    sprites = []
+    for image in _synthetic_images(count, size, seed):
+        rgba = np.array(image.convert("RGBA"))
+        small = rng.random((size // 16, size // 16)) > 0.5
+        rgba[..., 3] = np.kron(small, np.ones((16, 16), dtype=bool)).astype(np.uint8) * 255
+        sprites.append(Image.fromarray(rgba))
+    return sprites
+
+def bench_outline(args):
+    """Contorno: 8 transformaciones AFFINE originales vs dilatación separable vectorizada."""
+    from image_utils import add_pixel_outline, outline_array
+
+    sprites = _synthetic_sprites(args.images, args.size)
+
+    start = time.perf_counter()
+    reference = [_outline_affine(sprite) for sprite in sprites]
+    affine_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fast = [add_pixel_outline(sprite) for sprite in sprites]
+    fast_time = time.perf_counter() - start
+
+    # Sin conversiones PIL <-> NumPy (como dentro de un pipeline que ya trabaja con arrays)
+    arrays = [np.asarray(sprite) for sprite in sprites]
+    start = time.perf_counter()
+    for array in arrays:
+        outline_array(array)
+    array_time = time.perf_counter() - start
+
+    batch = np.stack(arrays)
+    start = time.perf_counter()
+    outline_array(batch)
+    batch_time = time.perf_counter() - start
+
+    identical = all(np.array_equal(np.asarray(a), np.asarray(b)) for a, b in zip(reference, fast))
+    print(f"{'método':>8} | {'ms/img':>8} | {'speedup':>8}")
+    print(f"{'affine':>8} | {affine_time / len(sprites) * 1000:>8.2f} | {'1.0x':>8}")
+    print(f"{'numpy':>8} | {fast_time / len(sprites) * 1000:>8.2f} | {affine_time / fast_time:>7.1f}x")
+    print(f"{'array':>8} | {array_time / len(sprites) * 1000:>8.2f} | {affine_time / array_time:>7.1f}x")
+    print(f"{'batch':>8} | {batch_time / len(sprites) * 1000:>8.2f} | {affine_time / batch_time:>7.1f}x")
+    print(f"idéntico (alfa binario): {identical}")
+
+def bench_native(args):
+    """Post-procesado + PNG a 768x768 vs bajando primero a la rejilla de pixel nativa (bloques 8x8)."""
+    import io
+    from postprocess import postprocess_rgba
+    from pixel_grid import estimate_pixel_grid
+
+    arrays = [np.asarray(sprite) for sprite in _synthetic_sprites(args.images, args.size)]
+
+    def run(native_res):
+        results, png_bytes = [], 0
+        for array in arrays:
+            result = postprocess_rgba(array, palette=None, native_res=native_res)
+            buffer = io.BytesIO()
+            Image.fromarray(result).save(buffer, format="PNG")
+            png_bytes += buffer.tell()
+            results.append(result)
+        return results, png_bytes
+
+    start = time.perf_counter()
+    full, full_bytes = run(False)
+    full_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    native, native_bytes = run(True)
+    native_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    grids = [estimate_pixel_grid(array) for array in arrays]
+    detect_time = time.perf_counter() - start
+
+    full_pixels = sum(result.shape[0] * result.shape[1] for result in full)
+    native_pixels = sum(result.shape[0] * result.shape[1] for result in native)
+    print(f"{'modo':>8} | {'ms/img':>8} | {'pixels/img':>10} | {'KB/img':>8}")
+    print(f"{'full':>8} | {full_time / len(arrays) * 1000:>8.2f} | {full_pixels // len(arrays):>10} | "
+          f"{full_bytes / len(arrays) / 1024:>8.1f}")
+    print(f"{'native':>8} | {native_time / len(arrays) * 1000:>8.2f} | {native_pixels // len(arrays):>10} | "
+          f"{native_bytes / len(arrays) / 1024:>8.1f}")
+    print(f"detección de rejilla: {detect_time / len(arrays) * 1000:.2f} ms/img, "
+          f"tamaños detectados: {sorted({grid['pixel_size'] for grid in grids})}")
+    print(f"speedup: {full_time / native_time:.1f}x, pixels guardados: {full_pixels / native_pixels:.0f}x menos")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del pipeline de assets")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    qa_parser = subparsers.add_parser("qa", help="Throughput del evaluador CLIP por tamaño de batch")
+    qa_parser.add_argument("--images", type=int, default=32, help="Imágenes por medición")
+    qa_parser.add_argument("--batch_sizes", type=int, nargs="+", default=[1, 4, 8, 16])
+    qa_parser.set_defaults(func=bench_qa)
+
+    terrain_parser = subparsers.add_parser("terrain", help="Render de tiles de terreno por tamaño de tile")
+    terrain_parser.add_argument("--sizes", type=int, nargs="+", default=[32, 64, 128])
+    terrain_parser.add_argument("--variations", type=int, default=20, help="Variaciones por medición")
+    terrain_parser.set_defaults(func=bench_terrain)
+
+    palette_parser = subparsers.add_parser("palette", help="Cuantización octree vs paleta fija con LUT")
+    palette_parser.add_argument("--images", type=int, default=16, help="Imágenes por medición")
+    palette_parser.add_argument("--size", type=int, default=512, help="Lado de las imágenes sintéticas")
+    palette_parser.set_defaults(func=bench_palette)
+
+    outline_parser = subparsers.add_parser("outline", help="Contorno AFFINE original vs dilatación vectorizada")
+    outline_parser.add_argument("--images", type=int, default=8, help="Imágenes por medición")
+    outline_parser.add_argument("--size", type=int, default=768, help="Lado de los sprites sintéticos")
+    outline_parser.set_defaults(func=bench_outline)
+
+    native_parser = subparsers.add_parser("native", help="Post-procesado a resolución generada vs nativa")
+    native_parser.add_argument("--images", type=int, default=8, help="Imágenes por medición")
+    native_parser.add_argument("--size", type=int, default=768, help="Lado de los sprites sintéticos")
+    native_parser.set_defaults(func=bench_native)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,136 @@
-import torch
-from rembg import remove, new_session
+import os
+import queue
+import threading
+import time
 from PIL import Image
 import numpy as np
 
-# Configuración Multi-GPU para rembg
-# Intentamos usar la GPU secundaria (cuda:1) si está disponible.
+# Configuración de rembg (u2netp en CPU)
 # CAMBIO: La GPU 1 (RTX 2060) está saturada (menos de 200MB libres).
 # Revertimos a CPU para garantizar estabilidad.
 providers = ['CPUExecutionProvider'] 
 
-# if torch.cuda.is_available():
-#     device_count = torch.cuda.device_count()
-#     if device_count > 1:
-#         providers = [
-#             ('CUDAExecutionProvider', {
-#                 'device_id': 1,
-#                 'arena_extend_strategy': 'kSameAsRequested',
-#             }),
-#             'CPUExecutionProvider',
-#         ]
-#         print(f"Configurando rembg (u2netp) en GPU Secundaria (device_id: 1)")
-#     else:
-#         print("Solo 1 GPU detectada. Usando CPU para rembg.")
+# La sesión ONNX se crea de forma PEREZOSA (primer remove_background del proceso):
+# importar image_utils ya no carga torch ni el modelo. Cada proceso mantiene un pool
+# de hasta pool_size sesiones; cada sesión usa intra_op/inter_op hilos de ONNX Runtime
+# (por defecto ORT usaría todos los núcleos en cada worker → sobresuscripción).
+_rembg_config = {
+    'model_name': 'u2netp',  # Mucho más ligero y rápido que 'u2net'
+    'intra_op_threads': 1,
+    'inter_op_threads': 1,
+    'pool_size': 1
+}
+_rembg_pool = None
+_rembg_created = 0
+_rembg_lock = threading.Lock()
 
-# Usamos 'u2netp' en lugar de 'u2net' por ser mucho más ligero y rápido
-session = new_session("u2netp", providers=providers)
+def configure_rembg(intra_op_threads: int = None, inter_op_threads: int = None, pool_size: int = None,
+                    model_name: str = None):
+    """
+    Ajusta el presupuesto de hilos de rembg en ESTE proceso (llamar antes del primer uso).
+    Hilos totales por proceso ≈ pool_size * intra_op_threads.
+    También fija OMP_NUM_THREADS antes de que se importe onnxruntime: es el único límite
+    que respetan las versiones de rembg sin sessions_class (ver _new_rembg_session).
+    """
+    global _rembg_pool, _rembg_created
+    
+    updates = {
+        'intra_op_threads': intra_op_threads,
+        'inter_op_threads': inter_op_threads,
+        'pool_size': pool_size,
+        'model_name': model_name
+    }
+    with _rembg_lock:
+        _rembg_config.update({k: v for k, v in updates.items() if v is not None})
+        _rembg_pool = None  # Las sesiones existentes se descartan
+        _rembg_created = 0
+        os.environ["OMP_NUM_THREADS"] = str(_rembg_config['intra_op_threads'])
+
+def _new_rembg_session():
+    """Crea una sesión rembg con SessionOptions propias (hilos acotados)."""
+    import onnxruntime as ort
+    from rembg import new_session
+    
+    sess_opts = ort.SessionOptions()
+    sess_opts.intra_op_num_threads = _rembg_config['intra_op_threads']
+    sess_opts.inter_op_num_threads = _rembg_config['inter_op_threads']
+    
+    try:
+        from rembg.sessions import sessions_class
+    except ImportError:
+        sessions_class = []
+    
+    for session_class in sessions_class:
+        if session_class.name() == _rembg_config['model_name']:
+            return session_class(_rembg_config['model_name'], sess_opts, providers)
+    
+    # Versiones de rembg sin sessions_class: new_session crea sus propias SessionOptions y solo
+    # respeta OMP_NUM_THREADS (leído al crear la sesión). configure_rembg ya lo fijó antes de
+    # importar onnxruntime; se reafirma aquí por si otro código lo cambió entretanto.
+    os.environ["OMP_NUM_THREADS"] = str(_rembg_config['intra_op_threads'])
+    return new_session(_rembg_config['model_name'], providers=providers)
+
+def _acquire_rembg_session():
+    """Toma una sesión libre del pool del proceso (la crea si aún no se llegó a pool_size)."""
+    global _rembg_pool, _rembg_created
+    
+    with _rembg_lock:
+        if _rembg_pool is None:
+            _rembg_pool = queue.Queue()
+        pool = _rembg_pool
+        try:
+            return pool, pool.get_nowait()
+        except queue.Empty:
+            if _rembg_created < _rembg_config['pool_size']:
+                _rembg_created += 1
+                return pool, _new_rembg_session()
+    
+    # Pool lleno: esperar a que otro hilo devuelva su sesión
+    return pool, pool.get()
 
-def remove_background(image: Image.Image) -> Image.Image:
-    """Elimina el fondo de una imagen usando rembg (GPU Secundaria o CPU)."""
+def remove_background_with_info(image: Image.Image, fast_matting: bool = True, min_confidence: float = 0.85):
+    """
+    Elimina el fondo y retorna (imagen RGBA, info).
+    fast_matting: intenta primero el matting heurístico de fondo blanco (ver matting.py);
+    si su confianza no llega a min_confidence, recurre a rembg (u2netp).
+    info: {'method': 'fast' | 'rembg', 'confidence', 'seconds'}
+    """
     if image is None:
-        return None
-    return remove(image, session=session)
+        return None, None
+    
+    start = time.perf_counter()
+    confidence = None
+    
+    if fast_matting:
+        from matting import white_background_matte
+        
+        rgb = np.asarray(image.convert("RGB"))
+        alpha, confidence = white_background_matte(rgb)
+        if confidence >= min_confidence:
+            result = Image.fromarray(np.dstack([rgb, alpha]))
+            return result, {'method': 'fast', 'confidence': confidence, 'seconds': time.perf_counter() - start}
+    
+    from rembg import remove
+    
+    pool, session = _acquire_rembg_session()
+    try:
+        result = remove(image, session=session)
+    finally:
+        pool.put(session)
+    
+    return result, {'method': 'rembg', 'confidence': confidence, 'seconds': time.perf_counter() - start}
+
+def remove_background(image: Image.Image, fast_matting: bool = True, min_confidence: float = 0.85) -> Image.Image:
+    """Elimina el fondo de una imagen: matting rápido de fondo blanco o rembg (sesión del pool, en CPU)."""
+    return remove_background_with_info(image, fast_matting, min_confidence)[0]
 
 def pixelate(image: Image.Image, pixel_size: int = 8) -> Image.Image:
     """
     Simula efecto pixel art reduciendo y re-escalando la imagen.
     pixel_size: Tamaño del 'pixel' lógico. Cuanto mayor, más 'bloque' se ve.
     Para una imagen de 512x512, un pixel_size de 8 reduce a 64x64.
+    Para salidas que ya son pixel art (bloques de la LoRA), pixel_grid.to_native_resolution
+    detecta la rejilla real y baja a un pixel por bloque sin re-escalar.
     """
     if image is None:
         return None
@@ -55,13 +149,21 @@ def pixelate(image: Image.Image, pixel_size: int = 8) -> Image.Image:
     # Escalar de vuelta al tamaño original usando NEAREST para el efecto pixelado
     return image_small.resize((w, h), resample=Image.Resampling.NEAREST)
 
-def quantize_colors(image: Image.Image, num_colors: int = 32) -> Image.Image:
+def quantize_colors(image: Image.Image, num_colors: int = 32, palette=None) -> Image.Image:
     """
     Reduce la paleta de colores de la imagen para un look más 'pixel art'.
-    Usa K-Means (via PIL quantize) para encontrar los colores dominantes.
+    Con palette (lista de (r, g, b)), mapea a esa paleta fija vía LUT 3D (ver palette_engine).
+    Sin palette, usa K-Means (via PIL quantize) para encontrar los colores dominantes de la imagen.
     """
     if image.mode != "RGBA":
         image = image.convert("RGBA")
+    
+    if palette is not None:
+        from palette_engine import apply_palette
+        
+        rgba = np.array(image)
+        rgba[..., :3] = apply_palette(rgba, palette)
+        return Image.fromarray(rgba)
         
     # Separar alfa para no cuantizarlo mal
     alpha = image.split()[3]
@@ -74,54 +176,84 @@ def quantize_colors(image: Image.Image, num_colors: int = 32) -> Image.Image:
     quantized_rgb.putalpha(alpha)
     return quantized_rgb
 
-def add_pixel_outline(image: Image.Image, color: tuple = (0, 0, 0), thickness: int = 1) -> Image.Image:
+def _max_along_axis(array: np.ndarray, radius: int, axis: int) -> np.ndarray:
+    """Máximo móvil de ventana 2*radius+1 sobre un eje (desplazamientos con slicing, sin copias extra)."""
+    result = array.copy()
+    ndim = array.ndim
+    axis = axis % ndim
+    for shift in range(1, radius + 1):
+        head = tuple(slice(shift, None) if i == axis else slice(None) for i in range(ndim))
+        tail = tuple(slice(None, -shift) if i == axis else slice(None) for i in range(ndim))
+        np.maximum(result[head], array[tail], out=result[head])
+        np.maximum(result[tail], array[head], out=result[tail])
+    return result
+
+def dilate_alpha(alpha: np.ndarray, thickness: int = 1, connectivity: int = 8) -> np.ndarray:
+    """
+    Dilatación en escala de grises del canal alfa (..., H, W) con radio thickness.
+    connectivity=8: vecindario cuadrado (max-filter separable, una pasada por eje).
+    connectivity=4: vecindario en diamante (thickness pasadas de cruz 3x3).
+    Admite batches: se dilatan los dos últimos ejes. Fuera de la imagen cuenta como transparente.
+    """
+    if connectivity not in (4, 8):
+        raise ValueError(f"connectivity debe ser 4 u 8 (recibido {connectivity})")
+    alpha = np.ascontiguousarray(alpha)
+    if thickness <= 0:
+        return alpha.copy()
+    
+    if connectivity == 8:
+        return _max_along_axis(_max_along_axis(alpha, thickness, -1), thickness, -2)
+    
+    dilated = alpha
+    for _ in range(thickness):
+        dilated = np.maximum(_max_along_axis(dilated, 1, -1), _max_along_axis(dilated, 1, -2))
+    return dilated
+
+def outline_array(rgba: np.ndarray, color: tuple = (0, 0, 0), thickness: int = 1, connectivity: int = 8) -> np.ndarray:
+    """
+    Contorno de pixel art sobre un array RGBA uint8 (..., H, W, 4), también en batch.
+    El contorno (alfa dilatado, color sólido) queda DETRÁS del contenido original.
+    Misma salida que Image.alpha_composite(contorno, imagen); en pixels semitransparentes
+    el alfa del propio pixel también cuenta para la dilatación.
+    """
+    rgba = np.ascontiguousarray(rgba)
+    alpha = np.ascontiguousarray(rgba[..., 3])
+    outline_alpha = dilate_alpha(alpha, thickness, connectivity)
+    
+    # Pixels transparentes: solo contorno (color del contorno con su alfa dilatado).
+    # Selección aritmética con máscaras 0/1 sobre el pixel empaquetado en uint32
+    # (sin ramas: mucho más rápido que np.where en imágenes con muchos bordes)
+    empty = alpha == 0
+    fill = np.array(tuple(color) + (0,), dtype=np.uint8).view(np.uint32)[0]
+    
+    result = np.empty_like(rgba)
+    packed = result.view(np.uint32)[..., 0]
+    np.multiply(rgba.view(np.uint32)[..., 0], (~empty).view(np.uint8), out=packed)
+    packed += empty.view(np.uint8) * fill
+    result[..., 3] += outline_alpha * empty.view(np.uint8)
+    
+    # Pixels semitransparentes: composición "imagen sobre contorno" (los opacos no cambian)
+    partial = ~empty & (alpha < 255)
+    if partial.any():
+        src = rgba[partial].astype(np.float32) / 255.0
+        dst_a = outline_alpha[partial].astype(np.float32)[:, None] / 255.0
+        src_a = src[:, 3:4]
+        out_a = src_a + dst_a * (1.0 - src_a)
+        out_rgb = (src[:, :3] * src_a + np.array(color, dtype=np.float32) / 255.0 * dst_a * (1.0 - src_a)) / out_a
+        result[partial, :3] = np.clip(np.rint(out_rgb * 255.0), 0, 255).astype(np.uint8)
+        result[partial, 3] = np.clip(np.rint(out_a[:, 0] * 255.0), 0, 255).astype(np.uint8)
+    
+    return result
+
+def add_pixel_outline(image: Image.Image, color: tuple = (0, 0, 0), thickness: int = 1, connectivity: int = 8) -> Image.Image:
     """
     Añade un contorno de pixel art alrededor del contenido opaco.
+    thickness: grosor en pixels; connectivity: 8 (esquinas incluidas) o 4 (solo cruz).
     """
     if image.mode != "RGBA":
         image = image.convert("RGBA")
-        
-    # Obtener máscara de transparencia
-    alpha = np.array(image.split()[3])
-    
-    # Crear kernel para dilatación
-    # Un kernel de 3x3 con cruz central expande 1 pixel en 4 direcciones
-    kernel_size = 1 + (thickness * 2)
-    kernel = np.ones((kernel_size, kernel_size), dtype=np.uint8)
-    
-    # Binarizar alfa (>0 es contenido)
-    mask = (alpha > 0).astype(np.uint8) * 255
-    
-    # Dilatar máscara (expandir bordes)
-    # Usamos scipy.ndimage.binary_dilation o max filter manual si no queremos deps extra
-    # Aquí usamos PIL filter para simplicidad y velocidad
-    from PIL import ImageFilter
-    
-    # Método simple: Desplazar la imagen en 8 direcciones y combinar
-    outline_mask = Image.new("L", image.size, 0)
-    alpha_layer = image.split()[3]
-    
-    # Desplazamientos para grosor 1: 8 vecinos
-    offsets = [(-1, -1), (0, -1), (1, -1),
-               (-1,  0),          (1,  0),
-               (-1,  1), (0,  1), (1,  1)]
-               
-    for ox, oy in offsets:
-        # Desplazar canal alfa
-        shifted = alpha_layer.transform(alpha_layer.size, Image.AFFINE, (1, 0, -ox, 0, 1, -oy))
-        # Sumar a la máscara de borde
-        outline_mask = Image.fromarray(np.maximum(np.array(outline_mask), np.array(shifted)))
-    
-    # El borde es: (Dilatado - Original) > 0
-    # Pero queremos dibujar el borde DETRÁS de la imagen original
-    
-    # Crear imagen solida del color del borde
-    outline_layer = Image.new("RGBA", image.size, color + (255,))
-    outline_layer.putalpha(outline_mask)
-    
-    # Componer: Borde abajo, Imagen original arriba
-    final_image = Image.alpha_composite(outline_layer, image)
-    return final_image
+    
+    return Image.fromarray(outline_array(np.asarray(image), color, thickness, connectivity))
 
 def create_gif(frames: list, output_path: str, duration: int = 150, loop: int = 0):
     """Crea un GIF animado a partir de una lista de imágenes PIL."""
@@ -147,26 +279,91 @@ def create_gif(frames: list, output_path: str, duration: int = 150, loop: int =
         disposal=2 # Restaurar fondo para transparencia
     )
 
-def validate_image(image: Image.Image) -> bool:
+# Umbrales del pre-filtro (sobre imágenes 768x768 de SDXL; los conteos son sobre la muestra)
+PRE_QA_THRESHOLDS = {
+    'sample_stride': 4,         # Se analiza 1 de cada 4 filas/columnas (~1/16 de los pixels)
+    'min_distinct_colors': 2,   # Un solo color (5 bits por canal) = frame uniforme, sin sprite
+    'max_distinct_colors': 8000,  # Más colores = degradados fotorrealistas, no pixel art
+    'min_foreground': 0.005,    # Fracción mínima de pixels opacos y no blancos (frame vacío)
+    'min_sharp_edge_ratio': 0.01,  # Fracción mínima de transiciones bruscas entre vecinos (si no, borrosa)
+    'max_objects': 3,           # Componentes grandes separadas: más = collage/cuadrícula
+    'min_object_area': 0.01     # Área mínima (fracción del frame) para contar como objeto
+}
+
+def _pre_qa_result(failure: str = '', reason: str = '') -> dict:
+    return {'ok': not failure, 'failure': failure, 'reason': reason}
+
+def pre_qa_check(image, thresholds: dict = None) -> dict:
     """
-    QA Básico: Retorna False si la imagen es inválida (negra, vacía, corrupta).
+    Pre-filtro barato (solo NumPy) antes de CLIP. Acepta PIL o array (H, W, 3|4) uint8.
+    Retorna {'ok', 'failure', 'reason'} con failure en:
+    transparent, empty, blurry, multi_object, not_pixel_art ('' si pasa).
     """
-    if image is None: return False
+    from scipy import ndimage
+    
+    if image is None:
+        return _pre_qa_result('error', "Imagen inexistente")
+    
+    t = dict(PRE_QA_THRESHOLDS, **(thresholds or {}))
+    pixels = np.asarray(image) if not isinstance(image, np.ndarray) else image
+    if pixels.ndim == 2:
+        pixels = pixels[..., None].repeat(3, axis=-1)
     
     # Verificar si es totalmente transparente
-    if image.mode == "RGBA":
-        extrema = image.getextrema()
-        if extrema[3][1] == 0: # Canal Alfa max es 0 (totalmente transparente)
-            return False
-            
-    # Verificar si es totalmente negra (en canales RGB)
-    # Convertir a grayscale para chequeo rápido
-    gray = image.convert("L")
-    extrema = gray.getextrema()
-    if extrema[0] == 0 and extrema[1] == 0: # Todo negro
-        return False
-        
-    return True
+    if pixels.shape[-1] == 4 and pixels[..., 3].max() == 0:
+        return _pre_qa_result('transparent', "Imagen totalmente transparente")
+    
+    step = t['sample_stride']
+    sample = pixels[::step, ::step, :3]
+    gray = sample.astype(np.int16).sum(axis=-1) // 3
+    
+    # Vacía: toda negra (salida típica del safety checker)
+    if gray.max() == 0:
+        return _pre_qa_result('empty', "Imagen totalmente negra")
+    
+    # Colores distintos (5 bits por canal). El pixel art plano usa muy pocos: solo un frame
+    # de un único color cuenta como vacío; el resto lo decide la cobertura de primer plano
+    cells = (sample >> 3).astype(np.int32)
+    packed = (cells[..., 0] << 10) | (cells[..., 1] << 5) | cells[..., 2]
+    distinct = np.unique(packed).size
+    if distinct < t['min_distinct_colors']:
+        return _pre_qa_result('empty', "Frame de un solo color")
+    if distinct > t['max_distinct_colors']:
+        return _pre_qa_result('not_pixel_art', f"Demasiados colores distintos ({distinct}): degradados, no pixel art")
+    
+    # Frame vacío: casi todo fondo blanco (o transparente)
+    foreground = (sample.min(axis=-1) < 237) | (sample.max(axis=-1).astype(np.int16) - sample.min(axis=-1) > 12)
+    if pixels.shape[-1] == 4:
+        foreground &= pixels[::step, ::step, 3] >= 128
+    if foreground.mean() < t['min_foreground']:
+        return _pre_qa_result('empty', f"Frame vacío ({foreground.mean() * 100:.2f}% de contenido)")
+    
+    # Nitidez: en pixel art los bordes entre bloques son escalones bruscos entre pixels vecinos;
+    # en una imagen borrosa casi todas las transiciones son graduales
+    rows = pixels[::step, :, :3].astype(np.int16).sum(axis=-1) // 3
+    steps = np.abs(np.diff(rows, axis=1))
+    changing = steps > 3
+    if changing.any():
+        sharp_ratio = (steps >= 32).sum() / changing.sum()
+        if sharp_ratio < t['min_sharp_edge_ratio']:
+            return _pre_qa_result('blurry', f"Sin bordes nítidos ({sharp_ratio * 100:.1f}% de transiciones bruscas): imagen borrosa")
+    
+    # Varios objetos separados (collage/cuadrícula de sprites)
+    labels, count = ndimage.label(foreground)
+    if count > t['max_objects']:
+        areas = np.bincount(labels.ravel())[1:] / labels.size
+        objects = int((areas >= t['min_object_area']).sum())
+        if objects > t['max_objects']:
+            return _pre_qa_result('multi_object', f"{objects} objetos separados: collage o cuadrícula")
+    
+    return _pre_qa_result()
+
+def validate_image(image: Image.Image) -> bool:
+    """
+    QA Básico: Retorna False si la imagen es inválida (vacía, negra, uniforme,
+    borrosa, collage...). Ver pre_qa_check para el motivo concreto.
+    """
+    return pre_qa_check(image)['ok']
 
 # ============================================================================
 # QA AVANZADO CON IA (CLIP en CPU)
@@ -209,6 +406,7 @@ def evaluate_image_quality(image: Image.Image, prompt: str = "") -> dict:
     - 'is_pixel_art': Boolean (qué tan "pixel art" se ve)
     """
     global _clip_model, _clip_processor
+    import torch
     
     # Si CLIP no está disponible, retornar valores por defecto
     if _clip_model is None:
@@ -293,42 +491,27 @@ def create_sprite_sheet(images: list[Image.Image], columns: int = 4) -> Image.Im
         
     return sprite_sheet
 
-def crop_to_content(image: Image.Image, padding: int = 10, alpha_threshold: int = 10, min_crop_ratio: float = 0.5) -> Image.Image:
+def content_bbox(alpha: np.ndarray, padding: int = 10, alpha_threshold: int = 10, min_crop_ratio: float = 0.5):
     """
-    Recorta la imagen al contenido visible con mejoras para tiles y paths.
-    
-    - alpha_threshold: Reducido a 10 (antes 50) para preservar sombras y detalles sutiles.
-    - padding: Aumentado a 10px (antes 2) para dar más margen.
-    - min_crop_ratio: Si el recorte resultaría en menos del 50% del área original, 
-      probablemente es un tile/path que debe mantener su tamaño completo.
+    Bounding box (left, upper, right, lower) del contenido visible a partir del canal alfa (H, W).
+    Retorna None si no hay que recortar (imagen vacía o recorte menor que min_crop_ratio).
     """
-    if image is None:
-        return None
-    
-    # Convertir a numpy para filtrado rápido
-    img_np = np.array(image)
-    
-    # Si no tiene canal alpha, retornar sin cambios
-    if len(img_np.shape) < 3 or img_np.shape[2] < 4:
-        return image
-        
     # Crear máscara de píxeles visibles (Alpha > umbral)
-    alpha_channel = img_np[:, :, 3]
-    mask = alpha_channel > alpha_threshold
+    mask = alpha > alpha_threshold
     
-    # Si la imagen está vacía tras el filtrado
-    if not np.any(mask):
-        return image
-        
     # Encontrar bounding box de la máscara
-    rows = np.any(mask, axis=1)
-    cols = np.any(mask, axis=0)
+    rows = np.flatnonzero(mask.any(axis=1))
+    
+    # Si la imagen está vacía tras el filtrado
+    if rows.size == 0:
+        return None
     
-    ymin, ymax = np.where(rows)[0][[0, -1]]
-    xmin, xmax = np.where(cols)[0][[0, -1]]
+    cols = np.flatnonzero(mask[rows[0]:rows[-1] + 1].any(axis=0))
+    ymin, ymax = rows[0], rows[-1]
+    xmin, xmax = cols[0], cols[-1]
     
     # Añadir padding
-    width, height = image.size
+    height, width = alpha.shape
     
     left = max(0, xmin - padding)
     upper = max(0, ymin - padding)
@@ -336,9 +519,7 @@ def crop_to_content(image: Image.Image, padding: int = 10, alpha_threshold: int
     lower = min(height, ymax + 1 + padding)
     
     # Calcular área del recorte vs área original
-    crop_width = right - left
-    crop_height = lower - upper
-    crop_area = crop_width * crop_height
+    crop_area = (right - left) * (lower - upper)
     original_area = width * height
     crop_ratio = crop_area / original_area if original_area > 0 else 1.0
     
@@ -346,8 +527,29 @@ def crop_to_content(image: Image.Image, padding: int = 10, alpha_threshold: int
     # probablemente es un tile/path que debe mantener dimensiones completas
     # (ej: un camino de 768x768 que tras recorte quedaría en 200x200)
     if crop_ratio < min_crop_ratio:
-        # No recortar, solo centrar el contenido en el canvas original
-        # Esto es útil para tiles que necesitan ser cuadrados
+        return None
+    
+    return int(left), int(upper), int(right), int(lower)
+
+def crop_to_content(image: Image.Image, padding: int = 10, alpha_threshold: int = 10, min_crop_ratio: float = 0.5) -> Image.Image:
+    """
+    Recorta la imagen al contenido visible con mejoras para tiles y paths.
+    
+    - alpha_threshold: Reducido a 10 (antes 50) para preservar sombras y detalles sutiles.
+    - padding: Aumentado a 10px (antes 2) para dar más margen.
+    - min_crop_ratio: Si el recorte resultaría en menos del 50% del área original, 
+      probablemente es un tile/path que debe mantener su tamaño completo.
+    """
+    if image is None:
+        return None
+    
+    # Si no tiene canal alpha, retornar sin cambios
+    if image.mode != "RGBA":
+        return image
+    
+    # Solo la banda alfa (sin copiar el frame RGBA completo)
+    bbox = content_bbox(np.asarray(image.getchannel("A")), padding, alpha_threshold, min_crop_ratio)
+    if bbox is None:
         return image
     
-    return image.crop((left, upper, right, lower))
+    return image.crop(bbox)
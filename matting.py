@@ -0,0 +1,63 @@
+"""
+Matting Rápido de Fondo Blanco
+Todos los prompts piden "isolated on white background": en la mayoría de
+imágenes el fondo es una región casi blanca conectada con los bordes.
+Se etiquetan las componentes conexas de pixels casi blancos, las que tocan
+el borde son fondo, y una puntuación de confianza decide si la máscara es
+fiable o si hay que recurrir a u2netp (rembg).
+"""
+import numpy as np
+from scipy import ndimage
+
+# Un pixel es "casi blanco" si todos sus canales superan 255 - WHITE_TOLERANCE
+# y es casi gris (diferencia entre canales <= CHROMA_TOLERANCE)
+WHITE_TOLERANCE = 18
+CHROMA_TOLERANCE = 12
+
+def white_background_matte(rgb: np.ndarray, white_tolerance: int = WHITE_TOLERANCE,
+                           chroma_tolerance: int = CHROMA_TOLERANCE):
+    """
+    Máscara alfa (H, W) uint8 para una imagen RGB sobre fondo blanco y su confianza en [0, 1].
+    Confianza baja = imagen ambigua (borde no blanco, halos/sombras claras, zonas blancas
+    encerradas en el sprite, o contenido casi vacío o casi a sangre).
+    """
+    rgb = rgb[..., :3]
+    channel_min = rgb.min(axis=-1)
+    channel_max = rgb.max(axis=-1)
+    chroma = channel_max - channel_min
+
+    near_white = (channel_min >= 255 - white_tolerance) & (chroma <= chroma_tolerance)
+
+    # Componentes conexas de blanco; las que tocan el borde son fondo
+    labels, _ = ndimage.label(near_white)
+    border_labels = np.unique(np.concatenate([labels[0], labels[-1], labels[:, 0], labels[:, -1]]))
+    border_labels = border_labels[border_labels > 0]
+    background = np.isin(labels, border_labels)
+
+    alpha = np.where(background, 0, 255).astype(np.uint8)
+
+    # --- Confianza ---
+    border = np.concatenate([near_white[0], near_white[-1], near_white[:, 0], near_white[:, -1]])
+    border_white = border.mean()
+
+    foreground = ~background
+    foreground_count = int(foreground.sum())
+    foreground_ratio = foreground_count / foreground.size
+    if foreground_count == 0 or foreground_ratio > 0.95:
+        return alpha, 0.0
+
+    # Blanco encerrado dentro del sprite: puede ser fondo atrapado (rembg lo quitaría)
+    enclosed_white = (near_white & foreground).sum() / foreground_count
+
+    # Halo: pixels del contorno del sprite casi blancos pero fuera de la tolerancia
+    # (antialias o sombra suave sobre el blanco → el corte duro dejaría un borde claro)
+    edge = foreground & ndimage.binary_dilation(background)
+    edge_count = int(edge.sum())
+    light = (channel_min >= 255 - 3 * white_tolerance) & (chroma <= 3 * chroma_tolerance)
+    halo = (light & edge).sum() / edge_count if edge_count else 0.0
+
+    confidence = border_white * (1.0 - enclosed_white) * (1.0 - halo)
+    if foreground_ratio < 0.01:
+        confidence *= foreground_ratio / 0.01  # Casi vacía: probablemente fallo de generación
+
+    return alpha, float(np.clip(confidence, 0.0, 1.0))
@@ -0,0 +1,118 @@
+"""
+Motor de Ruido Periódico
+Ruido de gradiente (Perlin 2D) que envuelve EXACTAMENTE en el tamaño del tile:
+cada octava usa un número entero de celdas de lattice y los índices se toman
+módulo ese número, así el pixel 0 y el pixel N continúan la misma función.
+✅ Sin estado global: cada seed crea su propio np.random.Generator (thread-safe)
+✅ Tablas de gradientes cacheadas por seed y compartidas entre octavas
+✅ Salida determinista por seed, normalizada a [0, 1]
+"""
+import numpy as np
+from functools import lru_cache
+
+TABLE_SIZE = 256
+
+@lru_cache(maxsize=1024)
+def _gradient_table(seed: int):
+    """Permutación + gradientes unitarios de una seed (solo lectura, compartidos entre octavas)."""
+    rng = np.random.default_rng(seed)
+    angles = rng.uniform(0.0, 2.0 * np.pi, TABLE_SIZE)
+    gradients = np.stack([np.cos(angles), np.sin(angles)], axis=-1)
+    permutation = rng.permutation(TABLE_SIZE)
+    gradients.setflags(write=False)
+    permutation.setflags(write=False)
+    return permutation, gradients
+
+@lru_cache(maxsize=256)
+def _lattice_coords(size: int, cells: int):
+    """
+    Coordenadas de lattice de un eje: celda inicial, celda siguiente (con wrap),
+    posición fraccional y su curva de suavizado (6t^5 - 15t^4 + 10t^3).
+    """
+    t = np.arange(size, dtype=np.float64) * cells / size
+    i0 = np.floor(t).astype(np.intp)
+    frac = t - i0
+    i0 %= cells
+    i1 = (i0 + 1) % cells
+    fade = frac * frac * frac * (frac * (frac * 6.0 - 15.0) + 10.0)
+    for array in (i0, i1, frac, fade):
+        array.setflags(write=False)
+    return i0, i1, frac, fade
+
+def _octave_cells(size: int, scale: float, frequency: float) -> int:
+    """Número entero de celdas para una octava (mínimo 1, garantiza el wrap exacto)."""
+    return max(1, int(round(size * frequency / scale)))
+
+def _stacked_tables(seeds):
+    """Tablas de gradientes de varias seeds apiladas: (C, T) y (C, T, 2)."""
+    tables = [_gradient_table(int(seed)) for seed in seeds]
+    permutations = np.stack([permutation for permutation, _ in tables])
+    gradients = np.stack([gradient for _, gradient in tables])
+    return permutations, gradients
+
+def _gradient_octave(permutations, gradients, shape, cells_y: int, cells_x: int, octave: int) -> np.ndarray:
+    """Una octava de ruido de gradiente periódico para C seeds a la vez: (C, H, W), en [-1, 1] aprox."""
+    yi0, yi1, fy, uy = _lattice_coords(shape[0], cells_y)
+    xi0, xi1, fx, ux = _lattice_coords(shape[1], cells_x)
+    count = permutations.shape[0]
+    batch = np.arange(count)[:, None, None]
+
+    # Hash de la esquina -> gradiente. El desfase por octava decorrelaciona octavas
+    # que comparten la misma tabla.
+    offset = octave * 67
+    hx0 = permutations[:, (xi0 + offset) % TABLE_SIZE]
+    hx1 = permutations[:, (xi1 + offset) % TABLE_SIZE]
+
+    def corner(hx, yi, dx, dy):
+        hashed = permutations[batch, (hx[:, None, :] + yi[None, :, None]) % TABLE_SIZE]
+        g = gradients[batch, hashed]
+        return g[..., 0] * dx[None, None, :] + g[..., 1] * dy[None, :, None]
+
+    n00 = corner(hx0, yi0, fx, fy)
+    n10 = corner(hx1, yi0, fx - 1.0, fy)
+    n01 = corner(hx0, yi1, fx, fy - 1.0)
+    n11 = corner(hx1, yi1, fx - 1.0, fy - 1.0)
+
+    wx = ux[None, None, :]
+    wy = uy[None, :, None]
+    top = n00 + wx * (n10 - n00)
+    bottom = n01 + wx * (n11 - n01)
+    return top + wy * (bottom - top)
+
+def _normalize(noise: np.ndarray) -> np.ndarray:
+    """Normaliza cada campo (C, H, W) a [0, 1] de forma independiente."""
+    low = noise.min(axis=(1, 2), keepdims=True)
+    high = noise.max(axis=(1, 2), keepdims=True)
+    return (noise - low) / (high - low + 1e-8)
+
+def periodic_noise_batch(shape, seeds, scale: float = 10.0, octaves: int = 4) -> np.ndarray:
+    """
+    C campos independientes de ruido fractal periódico en una sola llamada: (C, H, W), en [0, 1].
+    El campo i es idéntico a periodic_noise(shape, scale, octaves, seed=seeds[i]).
+    scale: tamaño aproximado en pixels de una celda de la primera octava.
+    """
+    seeds = list(seeds)
+    noise = np.zeros((len(seeds),) + tuple(shape), dtype=np.float64)
+    if not seeds:
+        return noise
+
+    permutations, gradients = _stacked_tables(seeds)
+    amplitude = 1.0
+    frequency = 1.0
+
+    for octave in range(octaves):
+        cells_y = _octave_cells(shape[0], scale, frequency)
+        cells_x = _octave_cells(shape[1], scale, frequency)
+        noise += _gradient_octave(permutations, gradients, shape, cells_y, cells_x, octave) * amplitude
+
+        amplitude *= 0.5
+        frequency *= 2.0
+
+    return _normalize(noise)
+
+def periodic_noise(shape, scale: float = 10.0, octaves: int = 4, seed: int = 0) -> np.ndarray:
+    """
+    Ruido fractal periódico de tamaño shape (H, W), en [0, 1].
+    scale: tamaño aproximado en pixels de una celda de la primera octava.
+    """
+    return periodic_noise_batch(shape, [seed], scale=scale, octaves=octaves)[0]
@@ -0,0 +1,126 @@
+"""
+Motor de Paletas por Bioma
+Una paleta fija de 32 colores por bioma (todos los assets del bioma comparten
+exactamente los mismos colores) y cuantización por tabla de búsqueda 3D:
+cada color RGB (5 bits por canal) tiene precalculado su color de paleta más
+cercano, así que mapear una imagen es un único gather vectorizado.
+La paleta de cada bioma se guarda como JSON junto a sus assets para poder
+intercambiarla en tiempo de ejecución.
+"""
+import json
+import numpy as np
+from functools import lru_cache
+from PIL import Image
+
+from procedural_tiles import BIOME_PALETTES
+
+LUT_BITS = 5
+LUT_SIZE = 1 << LUT_BITS
+LUT_SHIFT = 8 - LUT_BITS
+
+# Rampas de sombreado para completar la paleta cuando no hay imagen de estilo
+SHADE_FACTORS = (0.7, 1.3)
+
+@lru_cache(maxsize=8)
+def palette_from_image(image_path: str, num_colors: int = 32) -> tuple:
+    """Colores dominantes de una imagen de referencia (octree de PIL, una sola vez)."""
+    image = Image.open(image_path).convert("RGB")
+    quantized = image.quantize(colors=num_colors, method=1)
+    flat = quantized.getpalette()[:num_colors * 3]
+    return tuple(tuple(flat[i:i + 3]) for i in range(0, len(flat), 3))
+
+def _lut_cell(color) -> tuple:
+    return tuple(channel >> LUT_SHIFT for channel in color)
+
+def _shade(color: tuple, factor: float) -> tuple:
+    return tuple(int(min(255, max(0, round(channel * factor)))) for channel in color)
+
+@lru_cache(maxsize=None)
+def biome_palette(biome: str, num_colors: int = 32, style_image_path: str = None) -> tuple:
+    """
+    Paleta fija de un bioma: primero los colores de BIOME_PALETTES (exactos, así los
+    tiles procedurales no cambian), después los de la imagen de estilo si existe, o
+    rampas de sombreado de los colores base. Los extras que caen en la misma celda
+    de la LUT que un color ya elegido se descartan (nunca podrían producirse).
+    """
+    base = BIOME_PALETTES.get(biome, BIOME_PALETTES["Forest"])
+    colors = [color for group in base.values() for color in group]
+
+    if style_image_path:
+        extra = list(palette_from_image(style_image_path, num_colors))
+    else:
+        extra = [_shade(color, factor) for color in colors for factor in SHADE_FACTORS]
+
+    used_cells = {_lut_cell(color) for color in colors}
+    for color in extra:
+        if len(colors) >= num_colors:
+            break
+        if _lut_cell(color) not in used_cells:
+            colors.append(color)
+            used_cells.add(_lut_cell(color))
+
+    return tuple(colors[:num_colors])
+
+@lru_cache(maxsize=64)
+def _palette_lut(palette: tuple) -> np.ndarray:
+    """Tabla plana (LUT_SIZE^3, 3) con el color de paleta más cercano al centro de cada celda."""
+    colors = np.array(palette, dtype=np.int32)
+    centers = np.arange(LUT_SIZE, dtype=np.int32) * (1 << LUT_SHIFT) + (1 << LUT_SHIFT) // 2
+    grid = np.stack(np.meshgrid(centers, centers, centers, indexing="ij"), axis=-1).reshape(-1, 1, 3)
+
+    distances = ((grid - colors[None, :, :]) ** 2).sum(axis=-1)
+    nearest = distances.argmin(axis=1).reshape(LUT_SIZE, LUT_SIZE, LUT_SIZE)
+
+    # Cada color de la paleta se mapea a sí mismo; si dos comparten celda gana el primero
+    # (los perdedores se resuelven por coincidencia exacta en apply_palette)
+    for index in reversed(range(len(palette))):
+        r, g, b = colors[index] >> LUT_SHIFT
+        nearest[r, g, b] = index
+
+    lut = colors.astype(np.uint8)[nearest.reshape(-1)]
+    lut.setflags(write=False)
+    return lut
+
+def _pack_rgb(rgb: np.ndarray) -> np.ndarray:
+    rgb = rgb.astype(np.uint32)
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+@lru_cache(maxsize=64)
+def _shadowed_colors(palette: tuple) -> np.ndarray:
+    """Colores (empaquetados RGB) que comparten celda de la LUT con un color anterior de la paleta."""
+    seen, shadowed = set(), []
+    for color in palette:
+        cell = _lut_cell(color)
+        if cell in seen:
+            shadowed.append(color)
+        seen.add(cell)
+    return _pack_rgb(np.array(shadowed, dtype=np.uint8).reshape(-1, 3))
+
+def apply_palette(rgb: np.ndarray, palette) -> np.ndarray:
+    """Mapea un array (..., 3) uint8 a la paleta en una pasada (lookup en la LUT 3D)."""
+    palette = tuple(tuple(int(channel) for channel in color) for color in palette)
+    lut = _palette_lut(palette)
+
+    cells = rgb[..., :3] >> LUT_SHIFT
+    flat_index = cells[..., 0].astype(np.uint16) << (2 * LUT_BITS)
+    flat_index |= cells[..., 1].astype(np.uint16) << LUT_BITS
+    flat_index |= cells[..., 2]
+
+    mapped = np.take(lut, flat_index, axis=0)
+
+    # Paletas con colisiones de celda (p. ej. cargadas de JSON): los colores exactos se conservan
+    shadowed = _shadowed_colors(palette)
+    if shadowed.size:
+        exact = np.isin(_pack_rgb(rgb[..., :3]), shadowed)
+        mapped[exact] = rgb[..., :3][exact]
+
+    return mapped
+
+def save_palette(palette, path: str):
+    """Guarda la paleta como JSON (lista de [r, g, b])."""
+    with open(path, 'w') as f:
+        json.dump([list(color) for color in palette], f)
+
+def load_palette(path: str) -> tuple:
+    with open(path, 'r') as f:
+        return tuple(tuple(color) for color in json.load(f))
@@ -1,17 +1,36 @@
+import os
+import hashlib
 import torch
+from collections import OrderedDict
 from diffusers import StableDiffusionXLPipeline, EulerDiscreteScheduler
 from PIL import Image
 
 class PixelArtGenerator:
-    def __init__(self, model_id: str = "stabilityai/stable-diffusion-xl-base-1.0", device: str = "cuda"):
+    def __init__(self, model_id: str = "stabilityai/stable-diffusion-xl-base-1.0", device: str = "cuda", embed_cache_size: int = 256):
         self.device = device
         self.model_id = model_id
         self.pipe = None
         # LoRA específico para Pixel Art en SDXL
         self.lora_id = "nerijs/pixel-art-xl"
         
-    def load_model(self):
-        """Carga el modelo SDXL y el LoRA en memoria."""
+        # Caché LRU de embeddings de texto: {texto_final: (prompt_embeds, pooled_prompt_embeds)}
+        # Sirve tanto para prompts como para el negative prompt (se codifican igual)
+        self.embed_cache_size = embed_cache_size
+        self._embed_cache = OrderedDict()
+        self.embed_cache_hits = 0
+        self.embed_cache_misses = 0
+        
+        # IP-Adapter: pesos usados y embeddings precalculados de la imagen de estilo
+        self.ip_adapter_weights = ("h94/IP-Adapter", "sdxl_models", "ip-adapter_sdxl.bin")
+        self.ip_adapter_loaded = False
+        self.style_embeds = None
+        
+    def load_model(self, style_image_path: str = None, persist_style_embeds: bool = True):
+        """
+        Carga el modelo SDXL y el LoRA en memoria.
+        Si se indica style_image_path, la imagen de estilo se codifica aquí UNA vez
+        y sus embeddings de IP-Adapter se reutilizan en cada generate().
+        """
         print(f"Cargando modelo SDXL {self.model_id} en {self.device}...")
         
         # Cargar pipeline SDXL
@@ -42,6 +61,9 @@ class PixelArtGenerator:
         # Cargar IP-Adapter (Clonación de Estilo)
         self.load_ip_adapter()
         
+        if style_image_path is not None and self.ip_adapter_loaded:
+            self.load_style(style_image_path, persist=persist_style_embeds)
+        
         # Optimización: Compilar UNet (Solo funciona bien en Linux + Ampere/Ada)
         # DESACTIVADO: Causa OOM en SDXL + LoRA + IP-Adapter con 16GB VRAM
         # try:
@@ -54,7 +76,7 @@ class PixelArtGenerator:
 
     def generate(
         self,
-        prompt: str,
+        prompt,
         negative_prompt: str = "blurry, low quality, photo, realistic, 3d render, multiple objects, grid, collage, text, watermark, signature, cropped, out of frame",
         num_inference_steps: int = 30,
         guidance_scale: float = 7.5,
@@ -62,63 +84,124 @@ class PixelArtGenerator:
         height: int = 768, # Reducido de 1024 para evitar OOM con IP-Adapter
         num_images: int = 1,
         seed: int = None,
-        ip_adapter_image = None, # Imagen de referencia para estilo
+        seeds: list = None, # Seeds explícitas, una por imagen (None = aleatoria)
+        ip_adapter_image = None, # Imagen de referencia ad-hoc (por defecto se usan los embeddings de load_style)
         ip_adapter_scale: float = 0.6
     ):
         """
-        Genera imágenes basadas en el prompt.
-        Retorna: (lista_de_imagenes, metadatos_dict)
+        Genera imágenes basadas en el prompt, en UNA sola llamada al pipeline.
+        prompt: str (se repite para cada imagen) o lista de prompts (uno por imagen).
+        seeds: una seed por imagen; cada imagen es reproducible por separado con su seed.
+        Retorna: (lista_de_imagenes, lista_de_metadatos) con un dict por imagen.
         """
         if self.pipe is None:
             raise RuntimeError("El modelo no está cargado. Llama a load_model() primero.")
+        
+        prompts = [prompt] if isinstance(prompt, str) else list(prompt)
+        
+        # Resolver número de imágenes y seeds
+        if seeds is None:
+            batch_size = len(prompts) if len(prompts) > 1 else num_images
+            seeds = [seed + i if seed is not None else None for i in range(batch_size)]
+        if len(prompts) == 1:
+            prompts = prompts * len(seeds)
+        if len(prompts) != len(seeds):
+            raise ValueError(f"Se recibieron {len(prompts)} prompts para {len(seeds)} seeds")
+        
+        # Gestión de Seed para reproducibilidad
+        seeds = [s if s is not None else torch.randint(0, 2**32 - 1, (1,)).item() for s in seeds]
             
         # Trigger word del LoRA suele ser 'pixel art'
-        prompt = f"pixel art, {prompt}, sharp, detailed, 8-bit, retro game asset"
+        prompts = [f"pixel art, {p}, sharp, detailed, 8-bit, retro game asset" for p in prompts]
         negative_prompt = f"blur, fuzzy, realistic, photo, 3d render, vector, smooth, {negative_prompt}"
-
-        # Gestión de Seed para reproducibilidad
-        if seed is None:
-            seed = torch.randint(0, 2**32 - 1, (1,)).item()
         
         # Con CPU Offload, es mejor usar un generador en CPU para evitar conflictos de dispositivo
         # o dejar que diffusers maneje el dispositivo si pasamos un int.
-        # Pero para reproducibilidad exacta, usamos CPU generator.
-        generator = torch.Generator(device="cpu").manual_seed(seed)
+        # Pero para reproducibilidad exacta, usamos un CPU generator POR IMAGEN:
+        # los latentes de cada imagen dependen solo de su seed, no del batch.
+        generators = [torch.Generator(device="cpu").manual_seed(s) for s in seeds]
+            
+        # Estilo: imagen explícita o embeddings precalculados (sin pasar por el image encoder)
+        use_style = ip_adapter_image is not None or self.style_embeds is not None
             
         # Configurar IP-Adapter scale si se usa
-        if ip_adapter_image is not None:
+        if use_style:
             if hasattr(self.pipe, "set_ip_adapter_scale"): # Check if method exists
                 self.pipe.set_ip_adapter_scale(ip_adapter_scale)
             
+        # Embeddings de texto desde la caché (los encoders solo corren para textos nuevos)
+        prompt_embeds, pooled_prompt_embeds = zip(*[self._encode_text(p) for p in prompts])
+        negative_embeds, negative_pooled_embeds = self._encode_text(negative_prompt)
+            
         kwargs = {
-            "prompt": prompt,
-            "negative_prompt": negative_prompt,
+            "prompt_embeds": torch.cat(prompt_embeds),
+            "pooled_prompt_embeds": torch.cat(pooled_prompt_embeds),
+            "negative_prompt_embeds": negative_embeds.repeat(len(prompts), 1, 1),
+            "negative_pooled_prompt_embeds": negative_pooled_embeds.repeat(len(prompts), 1),
             "num_inference_steps": num_inference_steps,
             "guidance_scale": guidance_scale,
             "width": width,
             "height": height,
-            "num_images_per_prompt": num_images,
-            "generator": generator,
+            "num_images_per_prompt": 1,
+            "generator": generators,
         }
         
         if ip_adapter_image is not None:
             kwargs["ip_adapter_image"] = ip_adapter_image
+        elif self.style_embeds is not None:
+            kwargs["ip_adapter_image_embeds"] = self.style_embeds
             
         output = self.pipe(**kwargs)
         
-        metadata = {
-            "prompt": prompt,
-            "seed": seed,
+        metadata = [{
+            "prompt": p,
+            "seed": s,
             "steps": num_inference_steps,
             "cfg": guidance_scale,
             "width": width,
             "height": height,
             "model": "SDXL 1.0 + Pixel Art LoRA",
-            "ip_adapter_scale": ip_adapter_scale if ip_adapter_image else 0.0
-        }
+            "ip_adapter_scale": ip_adapter_scale if use_style else 0.0
+        } for p, s in zip(prompts, seeds)]
         
         return output.images, metadata
 
+    def _encode_text(self, text: str):
+        """
+        Retorna (prompt_embeds, pooled_prompt_embeds) del texto final usando la caché LRU.
+        En un miss se ejecutan ambos text encoders de SDXL una sola vez.
+        """
+        cached = self._embed_cache.get(text)
+        if cached is not None:
+            self._embed_cache.move_to_end(text)
+            self.embed_cache_hits += 1
+            return cached
+        
+        self.embed_cache_misses += 1
+        with torch.no_grad():
+            prompt_embeds, _, pooled_prompt_embeds, _ = self.pipe.encode_prompt(
+                prompt=text,
+                device=self.device,
+                num_images_per_prompt=1,
+                do_classifier_free_guidance=False
+            )
+        
+        self._embed_cache[text] = (prompt_embeds, pooled_prompt_embeds)
+        if len(self._embed_cache) > self.embed_cache_size:
+            self._embed_cache.popitem(last=False)
+        
+        return prompt_embeds, pooled_prompt_embeds
+
+    def cache_stats(self) -> dict:
+        """Contadores de la caché de embeddings de texto."""
+        total = self.embed_cache_hits + self.embed_cache_misses
+        return {
+            "hits": self.embed_cache_hits,
+            "misses": self.embed_cache_misses,
+            "size": len(self._embed_cache),
+            "hit_rate": self.embed_cache_hits / total if total else 0.0
+        }
+
     def load_ip_adapter(self):
         """Carga el IP-Adapter para SDXL."""
         try:
@@ -126,10 +209,43 @@ class PixelArtGenerator:
             # Nota: Esto requiere descargar modelos adicionales (~1.2GB)
             # Usamos el modelo oficial de IP-Adapter para SDXL
             # ID correcto: h94/IP-Adapter
-            self.pipe.load_ip_adapter("h94/IP-Adapter", subfolder="sdxl_models", weight_name="ip-adapter_sdxl.bin")
+            repo_id, subfolder, weight_name = self.ip_adapter_weights
+            self.pipe.load_ip_adapter(repo_id, subfolder=subfolder, weight_name=weight_name)
             # Nota: La implementación exacta depende de la librería diffusers instalada.
             # En versiones recientes, load_ip_adapter descarga automáticamente.
+            self.ip_adapter_loaded = True
             print("IP-Adapter cargado.")
         except Exception as e:
             print(f"Error cargando IP-Adapter: {e}")
             print("Continuando sin IP-Adapter.")
+
+    def load_style(self, style_image_path: str, persist: bool = True):
+        """
+        Codifica la imagen de estilo con el image encoder del IP-Adapter una sola vez.
+        Con persist=True los embeddings se guardan junto a la imagen, con el hash de la
+        imagen y de los pesos en el nombre; las siguientes ejecuciones no usan el encoder.
+        """
+        with open(style_image_path, "rb") as f:
+            hasher = hashlib.sha256(f.read())
+        hasher.update("/".join(self.ip_adapter_weights).encode())
+        digest = hasher.hexdigest()[:16]
+        cache_path = f"{os.path.splitext(style_image_path)[0]}.{digest}.ipadapter.pt"
+        
+        if persist and os.path.exists(cache_path):
+            embeds = torch.load(cache_path, map_location="cpu")
+            print(f"Embeddings de estilo cargados de caché: {cache_path}")
+        else:
+            style_image = Image.open(style_image_path).convert("RGB")
+            with torch.no_grad():
+                embeds = self.pipe.prepare_ip_adapter_image_embeds(
+                    ip_adapter_image=style_image,
+                    ip_adapter_image_embeds=None,
+                    device=self.device,
+                    num_images_per_prompt=1,
+                    do_classifier_free_guidance=True
+                )
+            if persist:
+                torch.save([e.cpu() for e in embeds], cache_path)
+                print(f"Embeddings de estilo guardados en: {cache_path}")
+        
+        self.style_embeds = [e.to(self.device, dtype=self.pipe.unet.dtype) for e in embeds]
@@ -0,0 +1,129 @@
+"""
+Detección de la Rejilla de Pixel y Bajada a Resolución Nativa
+SDXL + la LoRA de pixel art genera 768x768 donde cada "pixel" lógico es un
+bloque de ~8x8. Se estima el tamaño del bloque y la fase de la rejilla a partir
+de los bordes de color (las transiciones se concentran en las fronteras de
+bloque) y cada celda se reduce a un único pixel por voto de color mayoritario.
+Es la versión exacta de pixelate(): en vez de promediar una rejilla fija,
+se alinea con la rejilla real de la imagen y conserva colores duros.
+"""
+import numpy as np
+
+# Salto mínimo (suma de canales) entre pixels vecinos para contar como borde de color
+EDGE_THRESHOLD = 24
+MIN_PIXEL_SIZE = 2
+MAX_PIXEL_SIZE = 32
+# Margen mínimo sobre el azar (fracción de bordes en la rejilla - 1/size) para aplicar el ajuste:
+# con pixel_size 2 el ruido sin rejilla ya deja ~0.5 de los bordes sobre ella
+MIN_GRID_SCORE = 0.25
+# Solo se miden bordes en 1 de cada N filas/columnas (la rejilla es la misma en todas)
+SAMPLE_STRIDE = 4
+# Bits por canal al votar el color (agrupa ruido de compresión/antialias del modelo)
+VOTE_BITS = 4
+
+def _edge_peaks(steps: np.ndarray) -> np.ndarray:
+    """
+    Bordes (H, W-1) bool a partir de los saltos entre columnas: solo los máximos locales
+    a lo largo de la fila, así un borde suavizado por el modelo cuenta en una sola posición.
+    """
+    peaks = steps >= EDGE_THRESHOLD
+    peaks[:, 1:] &= steps[:, 1:] >= steps[:, :-1]
+    peaks[:, :-1] &= steps[:, :-1] > steps[:, 1:]
+    return peaks
+
+def _line_edges(lines: np.ndarray) -> np.ndarray:
+    """Bordes por posición a lo largo de un conjunto de líneas (L, N, C) → (N-1,)."""
+    pixels = lines.astype(np.int16)
+    # El RGB bajo alfa 0 es arbitrario: no debe generar bordes
+    if pixels.shape[-1] == 4:
+        pixels *= pixels[..., 3:] >= 128
+    steps = np.abs(np.diff(pixels, axis=1)).sum(axis=-1, dtype=np.int16)
+    return _edge_peaks(steps).sum(axis=0)
+
+def _edge_profiles(rgba: np.ndarray):
+    """Número de bordes de color entre cada par de columnas (W-1,) y de filas (H-1,), sobre líneas muestreadas."""
+    col_edges = _line_edges(rgba[::SAMPLE_STRIDE])
+    row_edges = _line_edges(rgba[:, ::SAMPLE_STRIDE].swapaxes(0, 1))
+    return col_edges, row_edges
+
+def _grid_scores(profile: np.ndarray, size: int):
+    """
+    Fracción de bordes en cada fase de un período size.
+    La frontera entre los pixels i e i+1 está en la posición i+1 (fase = (i+1) % size).
+    """
+    positions = np.arange(1, len(profile) + 1) % size
+    return np.bincount(positions, weights=profile, minlength=size) / max(profile.sum(), 1)
+
+def estimate_pixel_grid(rgba: np.ndarray, min_size: int = MIN_PIXEL_SIZE, max_size: int = MAX_PIXEL_SIZE) -> dict:
+    """
+    Estima el tamaño del pixel lógico y la fase de la rejilla de un array (H, W, 3|4) uint8.
+    Retorna {'pixel_size', 'phase_x', 'phase_y', 'confidence', 'score'}; pixel_size 1 si no hay rejilla clara.
+    confidence es la fracción de bordes sobre la rejilla; score le resta la esperada al azar (1/size),
+    así los múltiplos del tamaño real (16, 24...) no ganan y el ruido sin rejilla puntúa ~0.
+    """
+    col_edges, row_edges = _edge_profiles(rgba)
+    total = col_edges.sum() + row_edges.sum()
+    best = {'pixel_size': 1, 'phase_x': 0, 'phase_y': 0, 'confidence': 0.0, 'score': 0.0}
+    if total == 0:
+        return best
+
+    best_score = 0.0
+    max_size = min(max_size, min(rgba.shape[:2]) // 2)
+    for size in range(min_size, max_size + 1):
+        x_scores = _grid_scores(col_edges, size)
+        y_scores = _grid_scores(row_edges, size)
+        phase_x, phase_y = int(x_scores.argmax()), int(y_scores.argmax())
+
+        on_grid = (x_scores[phase_x] * col_edges.sum() + y_scores[phase_y] * row_edges.sum()) / total
+        score = on_grid - 1.0 / size
+        if score > best_score:
+            best_score = score
+            best = {'pixel_size': size, 'phase_x': phase_x, 'phase_y': phase_y,
+                    'confidence': float(on_grid), 'score': float(score)}
+
+    return best
+
+def _cell_majority(cells: np.ndarray) -> np.ndarray:
+    """
+    Color mayoritario de cada celda: cells (N, K, 4) uint8 → (N, 4) uint8.
+    Vota sobre el color reducido a VOTE_BITS por canal y devuelve un pixel real del grupo
+    ganador (color limpio, sin mezclar con los vecinos de la frontera).
+    """
+    # Clave de voto: los 4 canales truncados empaquetados en un uint32 (sin copias por canal)
+    vote_mask = np.uint8((0xFF << (8 - VOTE_BITS)) & 0xFF)
+    keys = np.ascontiguousarray(cells & vote_mask).view(np.uint32)[..., 0]
+
+    # Moda por fila: ordenar y buscar la racha más larga
+    ordered = np.sort(keys, axis=1)
+    index = np.arange(keys.shape[1])
+    run_start = np.ones(ordered.shape, dtype=bool)
+    run_start[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    last_start = np.maximum.accumulate(np.where(run_start, index, 0), axis=1)
+    winner = ordered[np.arange(len(ordered)), (index - last_start).argmax(axis=1)]
+
+    first_member = (keys == winner[:, None]).argmax(axis=1)
+    return cells[np.arange(len(cells)), first_member]
+
+def snap_to_grid(rgba: np.ndarray, pixel_size: int, phase_x: int = 0, phase_y: int = 0) -> np.ndarray:
+    """
+    Reduce un array (H, W, 4) uint8 a un pixel por celda de la rejilla (color mayoritario).
+    Las celdas parciales del borde (antes de la fase o al final) se descartan.
+    """
+    height, width = rgba.shape[:2]
+    rows = (height - phase_y) // pixel_size
+    cols = (width - phase_x) // pixel_size
+    grid = rgba[phase_y:phase_y + rows * pixel_size, phase_x:phase_x + cols * pixel_size]
+
+    cells = grid.reshape(rows, pixel_size, cols, pixel_size, -1).swapaxes(1, 2)
+    cells = cells.reshape(rows * cols, pixel_size * pixel_size, -1)
+    return _cell_majority(cells).reshape(rows, cols, -1)
+
+def to_native_resolution(rgba: np.ndarray, min_score: float = MIN_GRID_SCORE):
+    """
+    Detecta la rejilla y baja el array RGBA a resolución nativa.
+    Retorna (array, info de la rejilla); si la rejilla no supera al azar por min_score, el array original sin cambios.
+    """
+    grid = estimate_pixel_grid(rgba)
+    if grid['pixel_size'] < MIN_PIXEL_SIZE or grid['score'] < min_score:
+        return rgba, dict(grid, applied=False)
+    return snap_to_grid(rgba, grid['pixel_size'], grid['phase_x'], grid['phase_y']), dict(grid, applied=True)
@@ -0,0 +1,85 @@
+"""
+Post-procesado Fusionado sobre un Único Buffer RGBA
+remove_background → resolución nativa → recorte → cuantización → contorno trabajando siempre sobre
+el mismo array NumPy: el recorte es una vista calculada a partir de la banda
+alfa, la cuantización y el contorno solo tocan los pixels recortados, y la
+imagen PIL se materializa una única vez al guardar.
+"""
+import numpy as np
+from PIL import Image
+
+from image_utils import content_bbox, outline_array
+from palette_engine import apply_palette
+from pixel_grid import to_native_resolution
+
+# Margen del recorte en pixels de la imagen generada (se escala si se baja a resolución nativa)
+CROP_PADDING = 10
+
+def _quantize_adaptive(rgba: np.ndarray, num_colors: int) -> np.ndarray:
+    """Octree de PIL por imagen (paleta adaptativa); admite batch (..., H, W, 4)."""
+    frames = rgba.reshape((-1,) + rgba.shape[-3:])
+    for frame in frames:
+        rgb = Image.fromarray(np.ascontiguousarray(frame[..., :3]))
+        frame[..., :3] = np.asarray(rgb.quantize(colors=num_colors, method=1).convert("RGB"))
+    return rgba
+
+def postprocess_rgba_with_info(rgba: np.ndarray, apply_quantize: bool = True, apply_outline: bool = True,
+                               palette=None, num_colors: int = 32, crop: bool = True, native_res: bool = False):
+    """
+    Cadena de post-procesado sobre un array RGBA uint8 (H, W, 4), o un batch (N, H, W, 4) sin recorte.
+    native_res: detecta la rejilla de pixel y baja a un pixel por bloque (ver pixel_grid) ANTES de todo lo demás.
+    crop: recorta al contenido (misma regla que crop_to_content) ANTES de cuantizar y contornear.
+    palette: paleta fija del bioma (LUT 3D); None = octree adaptativo por imagen.
+    Retorna (array nuevo, info de la rejilla {'pixel_size', 'applied', 'confidence'}); la entrada no se modifica.
+    pixel_size es el factor entre la imagen generada y la guardada (1 si no se bajó a resolución nativa).
+    """
+    padding = CROP_PADDING
+    grid_info = {'pixel_size': 1, 'applied': False, 'confidence': 0.0}
+    if native_res:
+        rgba, grid = to_native_resolution(rgba)
+        grid_info['confidence'] = round(grid['confidence'], 3)
+        if grid['applied']:
+            grid_info.update(pixel_size=grid['pixel_size'], applied=True)
+            padding = max(1, CROP_PADDING // grid['pixel_size'])
+
+    if crop:
+        bbox = content_bbox(rgba[..., 3], padding)
+        if bbox is not None:
+            left, upper, right, lower = bbox
+            rgba = rgba[upper:lower, left:right]  # Vista, sin copia
+
+    # Único buffer propio de la cadena (solo del tamaño recortado)
+    buffer = np.array(rgba, dtype=np.uint8, order="C")
+
+    if apply_quantize:
+        if palette is not None:
+            buffer[..., :3] = apply_palette(buffer, palette)
+        else:
+            _quantize_adaptive(buffer, num_colors)
+
+    if apply_outline:
+        buffer = outline_array(buffer)
+
+    return buffer, grid_info
+
+def postprocess_rgba(rgba: np.ndarray, apply_quantize: bool = True, apply_outline: bool = True,
+                     palette=None, num_colors: int = 32, crop: bool = True, native_res: bool = False) -> np.ndarray:
+    """Cadena de post-procesado (ver postprocess_rgba_with_info); retorna solo el array."""
+    return postprocess_rgba_with_info(rgba, apply_quantize, apply_outline, palette, num_colors, crop, native_res)[0]
+
+def postprocess_image_with_info(image: Image.Image, apply_quantize: bool = True, apply_outline: bool = True,
+                                palette=None, num_colors: int = 32, crop: bool = True, native_res: bool = False):
+    """Post-procesa una imagen PIL (p. ej. la salida de rembg). Retorna (imagen lista para guardar, info de la rejilla)."""
+    if image is None:
+        return None, None
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+
+    buffer, grid_info = postprocess_rgba_with_info(np.asarray(image), apply_quantize, apply_outline, palette,
+                                                   num_colors, crop, native_res)
+    return Image.fromarray(buffer), grid_info
+
+def postprocess_image(image: Image.Image, apply_quantize: bool = True, apply_outline: bool = True,
+                      palette=None, num_colors: int = 32, crop: bool = True, native_res: bool = False) -> Image.Image:
+    """Post-procesa una imagen PIL y retorna la imagen lista para guardar."""
+    return postprocess_image_with_info(image, apply_quantize, apply_outline, palette, num_colors, crop, native_res)[0]
@@ -3,14 +3,18 @@ Generador Procedural MEJORADO de Tiles para Pixel Art
 ✅ Tiles perfectamente seamless (wrapping matemático)
 ✅ Sistema completo de transiciones césped-agua (16 tiles)
 ✅ 15 variantes de caminos
-✅ Máxima paralelización CPU
+✅ Todas las variaciones de un item en un batch vectorizado (NumPy)
 """
 import numpy as np
 from PIL import Image, ImageDraw
 import random
 from typing import List, Tuple
-from concurrent.futures import ThreadPoolExecutor
-from scipy.ndimage import zoom
+from functools import lru_cache
+from noise_engine import periodic_noise, periodic_noise_batch
+
+# Versión de la salida de los generadores: subirla al cambiar cualquier algoritmo
+# (invalida la caché de tiles y el manifiesto de los tiles procedurales)
+GENERATOR_VERSION = 3
 
 # Paletas de color por bioma (inmutables)
 BIOME_PALETTES = {
@@ -69,40 +73,87 @@ BIOME_PALETTES = {
 
 def perlin_noise_seamless(shape, scale=10.0, octaves=4, seed=0):
     """
-    Genera ruido Perlin PERFECTAMENTE SEAMLESS usando wrapping
+    Genera ruido Perlin PERFECTAMENTE SEAMLESS (periódico en el tamaño del tile)
+    Thread-safe y determinista por seed (ver noise_engine)
     """
-    np.random.seed(seed)
-    noise = np.zeros(shape)
-    amplitude = 1.0
-    frequency = 1.0
+    return periodic_noise(shape, scale=scale, octaves=octaves, seed=seed)
+
+# Brazos de cada variante de camino (conexiones con los bordes del tile)
+# T_X: tronco hacia X + barra pasante perpendicular. curve_XY: conecta X e Y. end_X: solo hacia X.
+PATH_ARMS = {
+    "horizontal": "EW", "vertical": "NS", "cross": "NSEW",
+    "curve_NE": "NE", "curve_NW": "NW", "curve_SE": "SE", "curve_SW": "SW",
+    "T_N": "NEW", "T_S": "SEW", "T_E": "ENS", "T_W": "WNS",
+    "end_N": "N", "end_S": "S", "end_E": "E", "end_W": "W"
+}
+
+class TileMaskLibrary:
+    """
+    Geometría precalculada para un tile_size: campos de distancia de transiciones
+    y máscaras base de caminos. Se comparte entre biomas y variaciones (solo lectura).
+    """
+    def __init__(self, tile_size: int):
+        self.tile_size = tile_size
+        ts = tile_size
+        y, x = np.mgrid[0:ts, 0:ts].astype(np.float64)
+        
+        # Transiciones: (campo, umbral base, amplitud del ruido, agua_si_menor)
+        # Agua donde campo < base + (ruido - 0.5) * amplitud (o > si agua_si_menor es False)
+        self.transitions = {
+            "edge_N": (y, ts * 0.5, 6, True),   # Agua arriba
+            "edge_S": (y, ts * 0.5, 6, False),  # Agua abajo
+            "edge_E": (x, ts * 0.5, 6, False),  # Agua derecha
+            "edge_W": (x, ts * 0.5, 6, True)    # Agua izquierda
+        }
+        corners = {"NE": (ts, 0), "NW": (0, 0), "SE": (ts, ts), "SW": (0, ts)}
+        for corner, (cx, cy) in corners.items():
+            dist = np.sqrt((x - cx) ** 2 + (y - cy) ** 2)
+            dist.setflags(write=False)
+            self.transitions[f"corner_{corner}"] = (dist, ts * 0.7, 8, True)   # Esquina externa
+            self.transitions[f"inner_{corner}"] = (dist, ts * 0.3, 8, False)   # Esquina interna (inverso)
+        
+        # Caminos: cuadrado central + un brazo por cada conexión
+        lo, hi = int(ts * 0.25), int(ts * 0.75)
+        arm_slices = {
+            "N": (slice(0, lo), slice(lo, hi)),
+            "S": (slice(hi, ts), slice(lo, hi)),
+            "E": (slice(lo, hi), slice(hi, ts)),
+            "W": (slice(lo, hi), slice(0, lo))
+        }
+        self.paths = {}
+        for variant, arms in PATH_ARMS.items():
+            mask = np.zeros((ts, ts), dtype=bool)
+            mask[lo:hi, lo:hi] = True
+            for arm in arms:
+                mask[arm_slices[arm]] = True
+            mask.setflags(write=False)
+            self.paths[variant] = mask
     
-    for _ in range(octaves):
-        # Crear grid extendido para wrapping
-        grid_size = (int(shape[0] / scale / frequency) + 2, 
-                     int(shape[1] / scale / frequency) + 2)
-        
-        # Generar ruido base
-        base = np.random.rand(*grid_size)
-        
-        # Wrap horizontalmente y verticalmente
-        base = np.tile(base, (2, 2))
-        
-        # Escalar al tamaño deseado
-        scaled = zoom(base, (shape[0] / base.shape[0], shape[1] / base.shape[1]), order=1)
-        
-        # Tomar solo la región que se repite
-        noise += scaled[:shape[0], :shape[1]] * amplitude
-        
-        amplitude *= 0.5
-        frequency *= 2.0
+    def water_mask(self, direction: str, noise: np.ndarray) -> np.ndarray:
+        """Máscara de agua de una transición: umbral del campo desplazado por el ruido."""
+        spec = self.transitions.get(direction)
+        if spec is None:
+            return np.zeros(noise.shape, dtype=bool)
+        field, base, amplitude, water_below = spec
+        threshold = base + (noise - 0.5) * amplitude
+        return field < threshold if water_below else field > threshold
     
-    # Normalizar
-    noise = (noise - noise.min()) / (noise.max() - noise.min() + 1e-8)
-    return noise
+    def path_mask(self, variant: str) -> np.ndarray:
+        """Máscara base de una variante de camino (vacía si la variante no existe)."""
+        mask = self.paths.get(variant)
+        if mask is None:
+            return np.zeros((self.tile_size, self.tile_size), dtype=bool)
+        return mask
+
+@lru_cache(maxsize=None)
+def get_mask_library(tile_size: int) -> TileMaskLibrary:
+    """Librería de máscaras por tile_size (se construye una sola vez por proceso)."""
+    return TileMaskLibrary(tile_size)
 
 class TileGenerator:
     def __init__(self, tile_size: int = 32):
         self.tile_size = tile_size
+        self.masks = get_mask_library(tile_size)
         
     def get_palette(self, biome: str, tile_type: str) -> List[Tuple[int, int, int]]:
         """Obtiene paleta de color para bioma y tipo"""
@@ -117,222 +168,150 @@ class TileGenerator:
             
         return BIOME_PALETTES[biome_key].get(palette_type, BIOME_PALETTES["Forest"]["grass"])
     
-    def generate_terrain_tile(self, terrain_type: str, biome: str, variation: int = 0) -> Image.Image:
-        """Genera tile de terreno SEAMLESS"""
-        img = Image.new("RGBA", (self.tile_size, self.tile_size), (0, 0, 0, 0))
-        pixels = img.load()
-        
+    def _variation_noise(self, variations, scale: float, octaves: int) -> np.ndarray:
+        """Ruido seamless de todas las variaciones en una sola llamada: (C, H, W)"""
+        return periodic_noise_batch((self.tile_size, self.tile_size), variations, scale=scale, octaves=octaves)
+    
+    def terrain_arrays(self, terrain_type: str, biome: str, variations) -> np.ndarray:
+        """Tiles de terreno SEAMLESS de varias variaciones: (C, H, W, 4) uint8"""
+        variations = list(variations)
         palette = self.get_palette(biome, terrain_type)
+        palette_array = np.array([color + (255,) for color in palette], dtype=np.uint8)
         
         # Ruido seamless
-        noise = perlin_noise_seamless((self.tile_size, self.tile_size), scale=8.0, octaves=3, seed=variation)
+        noise = self._variation_noise(variations, scale=8.0, octaves=3)
         
-        # Rellenar con colores
-        for y in range(self.tile_size):
-            for x in range(self.tile_size):
-                color_idx = int(noise[y, x] * (len(palette) - 1))
-                pixels[x, y] = palette[color_idx] + (255,)
+        # Rellenar con colores: índice de paleta por pixel y gather de todo el batch
+        index_map = (noise * (len(palette) - 1)).astype(np.intp)
+        rgba = palette_array[index_map]
         
-        # Añadir detalles mínimos
-        random.seed(variation)
+        # Añadir detalles mínimos (RNG local por variación: misma secuencia que random.seed y thread-safe)
         detail_color = (max(0, palette[0][0] - 30), max(0, palette[0][1] - 30), max(0, palette[0][2] - 30), 255)
         
-        for _ in range(self.tile_size // 8):
-            x = random.randint(0, self.tile_size - 1)
-            y = random.randint(0, self.tile_size - 1)
-            pixels[x, y] = detail_color
+        for i, variation in enumerate(variations):
+            rng = random.Random(variation)
+            for _ in range(self.tile_size // 8):
+                x = rng.randint(0, self.tile_size - 1)
+                y = rng.randint(0, self.tile_size - 1)
+                rgba[i, y, x] = detail_color
         
-        return img
+        return rgba
     
-    def generate_transition_tile(self, direction: str, biome: str, variation: int = 0) -> Image.Image:
+    def transition_arrays(self, direction: str, biome: str, variations) -> np.ndarray:
         """
-        Genera tile de transición césped-agua
+        Tiles de transición césped-agua de varias variaciones: (C, H, W, 4) uint8
         direction: 'edge_N', 'edge_S', 'edge_E', 'edge_W', 
                    'corner_NE', 'corner_NW', 'corner_SE', 'corner_SW',
                    'inner_NE', 'inner_NW', 'inner_SE', 'inner_SW'
         """
-        img = Image.new("RGBA", (self.tile_size, self.tile_size), (0, 0, 0, 0))
-        pixels = img.load()
-        
         grass_palette = self.get_palette(biome, "grass")
         water_palette = self.get_palette(biome, "water")
         
+        # Paleta combinada: [césped..., agua...]
+        palette_array = np.array([color + (255,) for color in grass_palette + water_palette], dtype=np.uint8)
+        
         # Ruido para ambos
-        noise = perlin_noise_seamless((self.tile_size, self.tile_size), scale=6.0, octaves=2, seed=variation)
+        noise = self._variation_noise(variations, scale=6.0, octaves=2)
+        
+        # Máscara según dirección (campo precalculado + umbral con ruido, broadcast sobre el batch)
+        is_water = self.masks.water_mask(direction, noise)
         
-        # Máscara según dirección
-        for y in range(self.tile_size):
-            for x in range(self.tile_size):
-                # Calcular si es agua o césped según la dirección
-                is_water = False
-                
-                if 'edge' in direction:
-                    if 'N' in direction:  # Agua arriba
-                        is_water = y < self.tile_size * 0.5 + (noise[y, x] - 0.5) * 6
-                    elif 'S' in direction:  # Agua abajo
-                        is_water = y > self.tile_size * 0.5 + (noise[y, x] - 0.5) * 6
-                    elif 'E' in direction:  # Agua derecha
-                        is_water = x > self.tile_size * 0.5 + (noise[y, x] - 0.5) * 6
-                    elif 'W' in direction:  # Agua izquierda
-                        is_water = x < self.tile_size * 0.5 + (noise[y, x] - 0.5) * 6
-                
-                elif 'corner' in direction:
-                    # Esquinas externas (diagonal)
-                    if 'NE' in direction:
-                        dist = np.sqrt((x - self.tile_size)**2 + y**2)
-                    elif 'NW' in direction:
-                        dist = np.sqrt(x**2 + y**2)
-                    elif 'SE' in direction:
-                        dist = np.sqrt((x - self.tile_size)**2 + (y - self.tile_size)**2)
-                    elif 'SW' in direction:
-                        dist = np.sqrt(x**2 + (y - self.tile_size)**2)
-                    
-                    is_water = dist < self.tile_size * 0.7 + (noise[y, x] - 0.5) * 8
-                
-                elif 'inner' in direction:
-                    # Esquinas internas (inverso)
-                    if 'NE' in direction:
-                        dist = np.sqrt((x - self.tile_size)**2 + y**2)
-                    elif 'NW' in direction:
-                        dist = np.sqrt(x**2 + y**2)
-                    elif 'SE' in direction:
-                        dist = np.sqrt((x - self.tile_size)**2 + (y - self.tile_size)**2)
-                    elif 'SW' in direction:
-                        dist = np.sqrt(x**2 + (y - self.tile_size)**2)
-                    
-                    is_water = dist > self.tile_size * 0.3 + (noise[y, x] - 0.5) * 8
-                
-                # Asignar color
-                if is_water:
-                    palette = water_palette
-                else:
-                    palette = grass_palette
-                
-                color_idx = int(noise[y, x] * (len(palette) - 1))
-                pixels[x, y] = palette[color_idx] + (255,)
+        # Asignar color: índice dentro de cada paleta, desplazado a la mitad de agua donde corresponde
+        grass_idx = (noise * (len(grass_palette) - 1)).astype(np.intp)
+        water_idx = (noise * (len(water_palette) - 1)).astype(np.intp) + len(grass_palette)
+        index_map = np.where(is_water, water_idx, grass_idx)
         
-        return img
+        return palette_array[index_map]
     
-    def generate_path_tile(self, path_variant: str, biome: str, variation: int = 0) -> Image.Image:
+    def path_arrays(self, path_variant: str, biome: str, variations) -> np.ndarray:
         """
-        Genera tiles de camino
+        Tiles de camino de varias variaciones: (C, H, W, 4) uint8
         path_variant: 'horizontal', 'vertical', 'curve_NE', 'T_N', 'cross', 'end_N', etc.
+        (ver PATH_ARMS para las conexiones de cada variante)
         """
-        img = Image.new("RGBA", (self.tile_size, self.tile_size), (0, 0, 0, 0))
-        pixels = img.load()
-        
         path_palette = self.get_palette(biome, "dirt")
+        palette_array = np.array([color + (255,) for color in path_palette], dtype=np.uint8)
         
         # Ruido de textura
-        noise = perlin_noise_seamless((self.tile_size, self.tile_size), scale=5.0, octaves=2, seed=variation)
-        
-        # Máscara del camino
-        path_mask = np.zeros((self.tile_size, self.tile_size), dtype=bool)
-        path_width = self.tile_size * 0.5  # 50% del tile
-        
-        # Definir máscara según variante
-        if 'horizontal' in path_variant:
-            path_mask[int(self.tile_size * 0.25):int(self.tile_size * 0.75), :] = True
+        noise = self._variation_noise(variations, scale=5.0, octaves=2)
         
-        elif 'vertical' in path_variant:
-            path_mask[:, int(self.tile_size * 0.25):int(self.tile_size * 0.75)] = True
+        # Máscara del camino (precalculada por tile_size)
+        path_mask = self.masks.path_mask(path_variant)
         
-        elif 'curve' in path_variant:
-            # Curvas en L
-            path_mask[int(self.tile_size * 0.25):int(self.tile_size * 0.75), :] = True  # Horizontal
-            path_mask[:, int(self.tile_size * 0.25):int(self.tile_size * 0.75)] = True  # Vertical
-            
-            # Eliminar cuadrante según dirección
-            if 'NE' in path_variant:
-                path_mask[:int(self.tile_size *0.5), :int(self.tile_size * 0.5)] = False
-            elif 'NW' in path_variant:
-                path_mask[:int(self.tile_size * 0.5), int(self.tile_size * 0.5):] = False
-            elif 'SE' in path_variant:
-                path_mask[int(self.tile_size * 0.5):, :int(self.tile_size * 0.5)] = False
-            elif 'SW' in path_variant:
-                path_mask[int(self.tile_size * 0.5):, int(self.tile_size * 0.5):] = False
-        
-        elif 'T_' in path_variant:
-            # T-junctions
-            path_mask[int(self.tile_size * 0.25):int(self.tile_size * 0.75), :] = True
-            path_mask[:, int(self.tile_size * 0.25):int(self.tile_size * 0.75)] = True
-            
-            # Eliminar lado según dirección
-            if 'N' in path_variant:
-                path_mask[:int(self.tile_size * 0.5), :] = True
-                path_mask[int(self.tile_size * 0.5):, :int(self.tile_size * 0.25)] = False
-                path_mask[int(self.tile_size * 0.5):, int(self.tile_size * 0.75):] = False
-            # ... etc
+        # Aplicar textura solo en camino (fuera queda transparente)
+        index_map = (noise * (len(path_palette) - 1)).astype(np.intp)
+        rgba = palette_array[index_map]
+        rgba[:, ~path_mask] = 0
         
-        elif 'cross' in path_variant:
-            # Cruce completo
-            path_mask[int(self.tile_size * 0.25):int(self.tile_size * 0.75), :] = True
-            path_mask[:, int(self.tile_size * 0.25):int(self.tile_size * 0.75)] = True
-        
-        elif 'end_' in path_variant:
-            # Terminaciones
-            path_mask[int(self.tile_size * 0.25):int(self.tile_size * 0.75), :int(self.tile_size * 0.5)] = True
-        
-        # Aplicar textura solo en camino
-        for y in range(self.tile_size):
-            for x in range(self.tile_size):
-                if path_mask[y, x]:
-                    color_idx = int(noise[y, x] * (len(path_palette) - 1))
-                    pixels[x, y] = path_palette[color_idx] + (255,)
-        
-        return img
+        return rgba
     
-    def generate_effect_tile(self, effect_type: str, variation: int = 0) -> Image.Image:
-        """Genera efectos simples (sombras, parches)"""
-        img = Image.new("RGBA", (self.tile_size, self.tile_size), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(img)
+    def effect_arrays(self, effect_type: str, variations) -> np.ndarray:
+        """Efectos simples (sombras, parches) de varias variaciones: (C, H, W, 4) uint8"""
+        variations = list(variations)
+        rgba = np.zeros((len(variations), self.tile_size, self.tile_size, 4), dtype=np.uint8)
         
         if 'shadow' in effect_type:
-            # Sombra semitransparente
+            # Sombra semitransparente (no depende de la variación: se dibuja una vez)
+            img = Image.new("RGBA", (self.tile_size, self.tile_size), (0, 0, 0, 0))
+            draw = ImageDraw.Draw(img)
             if 'circular' in effect_type:
                 draw.ellipse([4, 4, self.tile_size-4, self.tile_size-4], fill=(0, 0, 0, 100))
             else:  # square
                 draw.rectangle([4, 4, self.tile_size-4, self.tile_size-4], fill=(0, 0, 0, 80))
+            rgba[:] = np.asarray(img)
         
         elif 'dirt_patch' in effect_type:
-            # Parche de tierra
-            pixels = img.load()
-            noise = perlin_noise_seamless((self.tile_size, self.tile_size), scale=4.0, seed=variation)
-            
-            for y in range(self.tile_size):
-                for x in range(self.tile_size):
-                    if noise[y, x] > 0.4:
-                        brown = (101 + int(noise[y, x] * 30), 67, 33, 200)
-                        pixels[x, y] = brown
-        
-        return img
+            # Parche de tierra: marrón modulado por el ruido donde supera el umbral
+            noise = self._variation_noise(variations, scale=4.0, octaves=4)
+            patch = noise > 0.4
+            rgba[..., 0] = np.where(patch, 101 + (noise * 30).astype(np.uint8), 0)
+            rgba[..., 1] = np.where(patch, 67, 0)
+            rgba[..., 2] = np.where(patch, 33, 0)
+            rgba[..., 3] = np.where(patch, 200, 0)
+        
+        return rgba
     
-    def generate_batch(self, category: str, item: str, biome: str, count: int = 10) -> List[Image.Image]:
+    def generate_terrain_tile(self, terrain_type: str, biome: str, variation: int = 0) -> Image.Image:
+        """Genera tile de terreno SEAMLESS"""
+        return Image.fromarray(self.terrain_arrays(terrain_type, biome, [variation])[0])
+    
+    def generate_transition_tile(self, direction: str, biome: str, variation: int = 0) -> Image.Image:
+        """Genera tile de transición césped-agua (ver transition_arrays)"""
+        return Image.fromarray(self.transition_arrays(direction, biome, [variation])[0])
+    
+    def generate_path_tile(self, path_variant: str, biome: str, variation: int = 0) -> Image.Image:
+        """Genera tiles de camino (ver path_arrays)"""
+        return Image.fromarray(self.path_arrays(path_variant, biome, [variation])[0])
+    
+    def generate_effect_tile(self, effect_type: str, variation: int = 0) -> Image.Image:
+        """Genera efectos simples (sombras, parches)"""
+        return Image.fromarray(self.effect_arrays(effect_type, [variation])[0])
+    
+    def generate_batch_arrays(self, category: str, item: str, biome: str, count: int = 10) -> np.ndarray:
         """
-        Genera múltiples variaciones EN PARALELO
-        Aprovecha tutti CPU threads
+        Genera todas las variaciones de un item como un único array (count, H, W, 4) uint8
+        El ruido de las count variaciones sale de una sola llamada vectorizada
         """
-        def generate_single(idx):
-            if category == "Terrain":
-                return self.generate_terrain_tile(item, biome, variation=idx)
-            
-            elif category == "Terrain_Transitions":
-                # Extraer dirección del nombre
-                direction = item.replace("grass_water_", "")
-                return self.generate_transition_tile(direction, biome, variation=idx)
-            
-            elif category == "Paths":
-                # Extraer variante
-                variant = item.replace("path_", "")
-                return self.generate_path_tile(variant, biome, variation=idx)
-            
-            elif category == "Effects_Simple":
-                return self.generate_effect_tile(item, variation=idx)
-            
-            return None
+        variations = range(count)
+        
+        if category == "Terrain":
+            return self.terrain_arrays(item, biome, variations)
+        
+        elif category == "Terrain_Transitions":
+            # Extraer dirección del nombre
+            direction = item.replace("grass_water_", "")
+            return self.transition_arrays(direction, biome, variations)
         
-        # PARALELIZACIÓN MÁXIMA
-        with ThreadPoolExecutor(max_workers=min(count, 32)) as executor:
-            tiles = list(executor.map(generate_single, range(count)))
+        elif category == "Paths":
+            # Extraer variante
+            variant = item.replace("path_", "")
+            return self.path_arrays(variant, biome, variations)
         
-        return [t for t in tiles if t is not None]
+        elif category == "Effects_Simple":
+            return self.effect_arrays(item, variations)
+        
+        return np.zeros((0, self.tile_size, self.tile_size, 4), dtype=np.uint8)
+    
+    def generate_batch(self, category: str, item: str, biome: str, count: int = 10) -> List[Image.Image]:
+        """Genera múltiples variaciones como imágenes PIL (ver generate_batch_arrays)"""
+        return [Image.fromarray(tile) for tile in self.generate_batch_arrays(category, item, biome, count)]
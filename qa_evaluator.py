@@ -5,11 +5,27 @@ Usa CLIP-Large + Aesthetic Predictor en CPU para máxima precisión
 import torch
 from PIL import Image
 import numpy as np
+from functools import lru_cache
+
+# Textos fijos de comparación (sus embeddings se precalculan al inicializar)
+NEGATIVE_TEXTS = [
+    "blurry low quality image",
+    "photorealistic 3d render",
+    "abstract noise",
+    "empty black image",
+    "corrupted glitchy image"
+]
+PIXEL_ART_TEXTS = ["pixel art game sprite", "photorealistic photograph"]
 
 # Variables globales para modelos (lazy loading)
 _clip_model = None
 _clip_processor = None
 _aesthetic_model = None
+_device = "cpu"
+
+# Embeddings de texto constantes (normalizados)
+_negative_embeds = None
+_pixel_art_embeds = None
 
 def init_advanced_qa(device="cpu"):
     """
@@ -17,11 +33,14 @@ def init_advanced_qa(device="cpu"):
     - CLIP-ViT-Large-Patch14: Mejor comprensión semántica
     - Aesthetic Predictor: Score de calidad estética
     """
-    global _clip_model, _clip_processor, _aesthetic_model
+    global _clip_model, _clip_processor, _aesthetic_model, _device
+    global _negative_embeds, _pixel_art_embeds
     
     if _clip_model is not None:
         return  # Ya inicializado
     
+    _device = device
+    
     print("🔍 Cargando evaluador avanzado (CLIP-Large + Aesthetic)...")
     
     try:
@@ -37,6 +56,11 @@ def init_advanced_qa(device="cpu"):
         
         print("   ✅ CLIP-Large cargado")
         
+        # Precalcular embeddings de los textos fijos (una vez por proceso)
+        _prompt_embedding.cache_clear()
+        _negative_embeds = _encode_texts(NEGATIVE_TEXTS)
+        _pixel_art_embeds = _encode_texts(PIXEL_ART_TEXTS)
+        
         # Intentar cargar Aesthetic Predictor (opcional)
         try:
             # Modelo entrenado en calidad estética de imágenes
@@ -58,76 +82,65 @@ def init_advanced_qa(device="cpu"):
         print(f"❌ Error cargando evaluador: {e}")
         raise
 
-def evaluate_advanced(image: Image.Image, prompt: str = "", min_clip_score: float = 65.0, min_aesthetic: float = 5.0) -> dict:
-    """
-    Evaluación avanzada de calidad.
-    
-    Returns:
-        {
-            'clip_score': float (0-100),
-            'aesthetic_score': float (0-10),
-            'is_pixel_art': bool,
-            'is_good': bool,
-            'reason': str  # Si falla, explica por qué
-        }
-    """
-    global _clip_model, _clip_processor, _aesthetic_model
+def _encode_texts(texts: list) -> torch.Tensor:
+    """Codifica textos con CLIP y retorna embeddings normalizados."""
+    inputs = _clip_processor.tokenizer(
+        texts,
+        padding=True,
+        truncation=True,  # CLIP admite máximo 77 tokens
+        max_length=77,
+        return_tensors="pt"
+    ).to(_device)
     
-    if _clip_model is None:
-        raise RuntimeError("Evaluador no inicializado. Llama a init_advanced_qa() primero.")
+    with torch.no_grad():
+        text_features = _clip_model.get_text_features(**inputs)
     
-    result = {
+    return text_features / text_features.norm(dim=-1, keepdim=True)
+
+@lru_cache(maxsize=1024)
+def _prompt_embedding(positive_text: str) -> torch.Tensor:
+    """Embedding del texto positivo (LRU: los prompts se repiten entre variaciones)."""
+    return _encode_texts([positive_text])[0]
+
+def _encode_images(images: list) -> torch.Tensor:
+    """Un único forward de la torre de visión para N imágenes. Retorna features proyectadas (sin normalizar)."""
+    image_inputs = _clip_processor(images=images, return_tensors="pt")
+    with torch.no_grad():
+        return _clip_model.get_image_features(pixel_values=image_inputs["pixel_values"].to(_device))
+
+def _empty_result() -> dict:
+    return {
         'clip_score': 0.0,
         'aesthetic_score': 0.0,
         'is_pixel_art': False,
         'is_good': False,
-        'reason': ''
+        'reason': '',
+        'failure': ''  # Código de fallo: transparent, low_clip, not_pixel_art, low_aesthetic, error
     }
+
+def _score_embedding(image_embeds: torch.Tensor, prompt: str, min_clip_score: float, min_aesthetic: float) -> dict:
+    """
+    Calcula los tres scores a partir del embedding normalizado de UNA imagen (shape [1, D]).
+    Compartido por la ruta individual y la ruta en batch: mismos resultados por imagen.
+    """
+    result = _empty_result()
     
     try:
-        # 1. Validación básica (rápida)
-        if image.mode == "RGBA":
-            extrema = image.getextrema()
-            if extrema[3][1] == 0:  # Totalmente transparente
-                result['reason'] = "Imagen totalmente transparente"
-                return result
+        logit_scale = _clip_model.logit_scale.exp()
         
         # 2. CLIP Score (Relevancia al prompt)
         positive_text = f"high quality pixel art {prompt}" if prompt else "high quality pixel art game asset"
-        negative_texts = [
-            "blurry low quality image",
-            "photorealistic 3d render",
-            "abstract noise",
-            "empty black image",
-            "corrupted glitchy image"
-        ]
-        
-        inputs = _clip_processor(
-            text=[positive_text] + negative_texts,
-            images=image,
-            return_tensors="pt",
-            padding=True
-        )
+        text_embeds = torch.cat([_prompt_embedding(positive_text).unsqueeze(0), _negative_embeds])
         
         with torch.no_grad():
-            outputs = _clip_model(**inputs)
-            logits_per_image = outputs.logits_per_image
-            probs = logits_per_image.softmax(dim=1)
+            probs = (logit_scale * image_embeds @ text_embeds.T).softmax(dim=1)
         
         clip_score = probs[0][0].item() * 100
         result['clip_score'] = clip_score
         
         # 3. Verificar si es pixel art (vs foto/3D)
-        pixel_art_inputs = _clip_processor(
-            text=["pixel art game sprite", "photorealistic photograph"],
-            images=image,
-            return_tensors="pt",
-            padding=True
-        )
-        
         with torch.no_grad():
-            pa_outputs = _clip_model(**pixel_art_inputs)
-            pa_probs = pa_outputs.logits_per_image.softmax(dim=1)
+            pa_probs = (logit_scale * image_embeds @ _pixel_art_embeds.T).softmax(dim=1)
         
         is_pixel_art = pa_probs[0][0].item() > 0.7
         result['is_pixel_art'] = is_pixel_art
@@ -135,17 +148,12 @@ def evaluate_advanced(image: Image.Image, prompt: str = "", min_clip_score: floa
         # 4. Aesthetic Score (si disponible)
         if _aesthetic_model is not None:
             try:
-                # El modelo aesthetic espera embeddings de CLIP
-                image_inputs = _clip_processor(images=image, return_tensors="pt")
+                # El modelo aesthetic espera embeddings de CLIP normalizados
                 with torch.no_grad():
-                    image_features = _clip_model.get_image_features(**image_inputs)
-                    # Normalizar
-                    image_features = image_features / image_features.norm(dim=-1, keepdim=True)
-                    # Predecir score estético
-                    aesthetic_score = _aesthetic_model(image_features).item()
-                    # Escalar a 0-10
-                    aesthetic_score = max(0, min(10, aesthetic_score))
-                    result['aesthetic_score'] = aesthetic_score
+                    aesthetic_score = _aesthetic_model(image_embeds).item()
+                # Escalar a 0-10
+                aesthetic_score = max(0, min(10, aesthetic_score))
+                result['aesthetic_score'] = aesthetic_score
             except Exception as e:
                 # Si falla, usar un score neutral
                 result['aesthetic_score'] = 6.0
@@ -156,14 +164,17 @@ def evaluate_advanced(image: Image.Image, prompt: str = "", min_clip_score: floa
         # 5. Decisión final
         if clip_score < min_clip_score:
             result['reason'] = f"CLIP score bajo ({clip_score:.1f} < {min_clip_score})"
+            result['failure'] = 'low_clip'
             return result
         
         if not is_pixel_art:
             result['reason'] = "No parece pixel art (demasiado realista/3D)"
+            result['failure'] = 'not_pixel_art'
             return result
         
         if result['aesthetic_score'] < min_aesthetic:
             result['reason'] = f"Calidad estética baja ({result['aesthetic_score']:.1f} < {min_aesthetic})"
+            result['failure'] = 'low_aesthetic'
             return result
         
         # ✅ Aprobada
@@ -172,18 +183,68 @@ def evaluate_advanced(image: Image.Image, prompt: str = "", min_clip_score: floa
         
     except Exception as e:
         result['reason'] = f"Error en evaluación: {str(e)}"
+        result['failure'] = 'error'
     
     return result
 
-def evaluate_batch(images: list, prompts: list = None) -> list:
+def evaluate_advanced(image: Image.Image, prompt: str = "", min_clip_score: float = 65.0, min_aesthetic: float = 5.0) -> dict:
+    """
+    Evaluación avanzada de calidad.
+    La imagen se codifica UNA sola vez; los tres scores salen del mismo embedding.
+    
+    Returns:
+        {
+            'clip_score': float (0-100),
+            'aesthetic_score': float (0-10),
+            'is_pixel_art': bool,
+            'is_good': bool,
+            'reason': str,  # Si falla, explica por qué
+            'failure': str  # Código de fallo para la regeneración ('' si aprobada)
+        }
+    """
+    return evaluate_batch([image], [prompt], min_clip_score, min_aesthetic)[0]
+
+def evaluate_batch(images: list, prompts: list = None, min_clip_score: float = 65.0, min_aesthetic: float = 5.0) -> list:
     """
-    Evalúa un batch de imágenes en paralelo (más eficiente).
+    Evalúa un batch de imágenes con UN solo forward de CLIP para todo el batch.
+    Retorna una lista de resultados con el mismo formato que evaluate_advanced.
     """
+    global _clip_model, _clip_processor, _aesthetic_model
+    
+    if _clip_model is None:
+        raise RuntimeError("Evaluador no inicializado. Llama a init_advanced_qa() primero.")
+    
     if prompts is None:
         prompts = [""] * len(images)
     
-    results = []
-    for img, prompt in zip(images, prompts):
-        results.append(evaluate_advanced(img, prompt))
+    results = [_empty_result() for _ in images]
+    
+    # 1. Validación básica (rápida)
+    # Se aceptan imágenes PIL o arrays NumPy HWC (p.ej. vistas del ring compartido)
+    to_encode = []
+    for idx, image in enumerate(images):
+        if getattr(image, "mode", None) == "RGBA":
+            extrema = image.getextrema()
+            if extrema[3][1] == 0:  # Totalmente transparente
+                results[idx]['reason'] = "Imagen totalmente transparente"
+                results[idx]['failure'] = 'transparent'
+                continue
+        to_encode.append(idx)
+    
+    if not to_encode:
+        return results
+    
+    # Único forward de visión para todo el batch
+    try:
+        image_features = _encode_images([images[idx] for idx in to_encode])
+        image_embeds = image_features / image_features.norm(dim=-1, keepdim=True)
+    except Exception as e:
+        for idx in to_encode:
+            results[idx]['reason'] = f"Error en evaluación: {str(e)}"
+            results[idx]['failure'] = 'error'
+        return results
+    
+    for row, idx in enumerate(to_encode):
+        results[idx] = _score_embedding(image_embeds[row:row + 1], prompts[idx], min_clip_score, min_aesthetic)
     
     return results
@@ -0,0 +1,182 @@
+"""
+Servicio de QA Compartido
+Un pool fijo de procesos carga CLIP-Large + Aesthetic UNA sola vez y evalúa
+las peticiones de cualquier número de workers de post-procesado.
+La memoria se mantiene plana aunque crezca el número de workers CPU.
+"""
+import os
+import queue
+import time
+from multiprocessing import Queue, Process
+
+def collect_micro_batch(request_queue, max_batch_size: int, max_wait: float):
+    """
+    Micro-batcher: bloquea hasta la primera petición y luego sigue recogiendo
+    hasta llenar max_batch_size o agotar max_wait segundos.
+    Retorna (batch, stop) donde stop indica que llegó la señal de terminación.
+    """
+    try:
+        first = request_queue.get(timeout=5)
+    except queue.Empty:
+        return [], False
+
+    if first is None:
+        return [], True
+
+    batch = [first]
+    deadline = time.monotonic() + max_wait
+
+    while len(batch) < max_batch_size:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            request = request_queue.get(timeout=remaining)
+        except queue.Empty:
+            break
+        if request is None:
+            return batch, True
+        batch.append(request)
+
+    return batch, False
+
+def qa_service_worker(request_queue, response_queues, min_clip_score, min_aesthetic, num_threads=None,
+                      max_batch_size=8, max_wait=0.05, image_ring=None):
+    """
+    Proceso de servicio: posee los modelos y responde peticiones de evaluación.
+    Agrupa peticiones en micro-batches (un forward de CLIP por batch).
+    Cada petición indica el client_id para enrutar la respuesta a su cola.
+    Las peticiones con 'slot' se leen directamente del ring compartido (sin copia).
+    """
+    import torch
+    from qa_evaluator import init_advanced_qa, evaluate_batch
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+
+    init_advanced_qa(device="cpu")
+
+    stop = False
+    while not stop:
+        batch, stop = collect_micro_batch(request_queue, max_batch_size, max_wait)
+        if not batch:
+            continue
+
+        try:
+            images = [
+                image_ring.view(request['slot']) if 'slot' in request else request['image']
+                for request in batch
+            ]
+            results = evaluate_batch(
+                images,
+                [request['prompt'] for request in batch],
+                min_clip_score,
+                min_aesthetic
+            )
+        except Exception as e:
+            results = [{
+                'clip_score': 0.0,
+                'aesthetic_score': 0.0,
+                'is_pixel_art': False,
+                'is_good': False,
+                'reason': f"Error en servicio QA: {str(e)}",
+                'failure': 'error'
+            } for _ in batch]
+
+        for request, result in zip(batch, results):
+            response_queues[request['client_id']].put({
+                'request_id': request['request_id'],
+                'result': result
+            })
+
+class QAClient:
+    """
+    Cliente ligero usado por los workers de post-procesado.
+    No carga modelos: envía la imagen al servicio y espera su respuesta.
+    """
+    def __init__(self, client_id: int, request_queue, response_queue, timeout: float = 600.0):
+        self.client_id = client_id
+        self.request_queue = request_queue
+        self.response_queue = response_queue
+        self.timeout = timeout
+        self._next_request_id = 0
+
+    def evaluate(self, image, prompt: str = "") -> dict:
+        """Evalúa una imagen en el servicio compartido. Misma salida que evaluate_advanced."""
+        return self._request({'image': image, 'prompt': prompt})
+
+    def evaluate_slot(self, slot: int, prompt: str = "") -> dict:
+        """Evalúa la imagen de un slot del ring compartido (solo viaja el índice)."""
+        return self._request({'slot': slot, 'prompt': prompt})
+
+    def _request(self, payload: dict) -> dict:
+        self._next_request_id += 1
+        request_id = self._next_request_id
+
+        payload['client_id'] = self.client_id
+        payload['request_id'] = request_id
+        self.request_queue.put(payload)
+
+        while True:
+            try:
+                response = self.response_queue.get(timeout=self.timeout)
+            except queue.Empty:
+                raise TimeoutError(f"El servicio QA no respondió en {self.timeout:.0f}s")
+
+            # Descartar respuestas atrasadas de peticiones que expiraron
+            if response['request_id'] == request_id:
+                return response['result']
+
+class QAService:
+    """
+    Pool fijo de procesos de QA compartido por N clientes.
+    Uso:
+        service = QAService(num_clients=30, num_services=2)
+        service.start()
+        client = service.client(0)  # Pasar a cada worker
+        ...
+        service.stop()
+    """
+    def __init__(self, num_clients: int, num_services: int = 1, min_clip_score: float = 65.0,
+                 min_aesthetic: float = 5.0, threads_per_service: int = None,
+                 max_batch_size: int = 8, max_wait_ms: float = 50.0, image_ring=None):
+        self.num_clients = num_clients
+        self.num_services = max(1, num_services)
+        self.min_clip_score = min_clip_score
+        self.min_aesthetic = min_aesthetic
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.image_ring = image_ring
+
+        # Repartir los hilos de torch entre los procesos de servicio
+        if threads_per_service is None:
+            threads_per_service = max(1, (os.cpu_count() or 1) // self.num_services)
+        self.threads_per_service = threads_per_service
+
+        self.request_queue = Queue()
+        self.response_queues = [Queue() for _ in range(num_clients)]
+        self.processes = []
+
+    def start(self):
+        """Lanza los procesos de servicio (cada uno carga los modelos una vez)."""
+        for _ in range(self.num_services):
+            p = Process(
+                target=qa_service_worker,
+                args=(self.request_queue, self.response_queues, self.min_clip_score,
+                      self.min_aesthetic, self.threads_per_service, self.max_batch_size, self.max_wait,
+                      self.image_ring)
+            )
+            p.start()
+            self.processes.append(p)
+
+    def client(self, client_id: int) -> QAClient:
+        """Retorna el cliente asociado a un worker (client_id en [0, num_clients))."""
+        return QAClient(client_id, self.request_queue, self.response_queues[client_id])
+
+    def stop(self):
+        """Envía señal de terminación y espera a los procesos de servicio."""
+        for _ in self.processes:
+            self.request_queue.put(None)
+        for p in self.processes:
+            p.join()
+        self.processes = []
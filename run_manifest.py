@@ -0,0 +1,109 @@
+"""
+Manifiesto de Ejecución Reanudable
+Registro append-only (JSONL) de cada asset producido: hash de configuración,
+seed, resultado de QA y ruta de salida. Al reiniciar, las tareas con salida
+válida y el mismo hash de configuración se saltan; solo se regenera lo que
+falta o quedó obsoleto.
+"""
+import os
+import re
+import json
+import hashlib
+
+from tile_atlas import atlas_rects, is_atlas_path
+
+def config_hash(config: dict) -> str:
+    """Hash estable de los parámetros que determinan el contenido de un asset."""
+    payload = json.dumps(config, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+def open_jsonl_append(path: str):
+    """
+    Abre un JSONL en modo append. Si un crash dejó la última línea sin salto de línea,
+    lo añade primero: la siguiente entrada no se pega a la línea rota.
+    """
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+    return open(path, "a")
+
+def task_key(biome: str, category: str, item: str, variant: str) -> str:
+    """Clave única de un asset: (bioma, categoría, item, variación/frame)."""
+    return f"{biome}|{category}|{item}|{variant}"
+
+def variation_number(variant: str):
+    """'var3' → 4 (misma numeración que los PNG), 'frame2' → 2."""
+    match = re.fullmatch(r"(var|frame)(\d+)", variant or "")
+    if not match:
+        return None
+    number = int(match.group(2))
+    return number + 1 if match.group(1) == "var" else number
+
+class RunManifest:
+    """
+    Uso:
+        manifest = RunManifest("output_assets/manifest.jsonl")
+        if not manifest.is_done(key, cfg_hash):
+            ...generar...
+            manifest.record(key, cfg_hash, save_path, seed=seed, qa_scores=scores)
+        manifest.close()
+    Cada línea es una entrada completa; al cargar, la última entrada de cada clave gana.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        self._atlas_rects = {}  # png del atlas → (mtime del índice, rectángulos)
+
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Línea truncada por un crash: se ignora
+                    self.entries[entry["key"]] = entry
+
+        self._file = open_jsonl_append(path)
+
+    def is_done(self, key: str, cfg_hash: str) -> bool:
+        """True si la tarea ya tiene una salida válida generada con la misma configuración."""
+        entry = self.entries.get(key)
+        if entry is None or entry["config_hash"] != cfg_hash:
+            return False
+        output_path = entry["output_path"]
+        if not os.path.exists(output_path):
+            return False
+        if is_atlas_path(output_path):
+            # El atlas puede existir sin este tile (reescrito por otra ejecución): mirar el índice
+            _, category, item, variant = key.split("|")
+            return (category, item, variation_number(variant)) in self._atlas_index(output_path)
+        return True
+
+    def _atlas_index(self, png_path: str) -> dict:
+        """Rectángulos del índice del atlas, recargados solo si el JSON cambió."""
+        index_path = os.path.splitext(png_path)[0] + ".json"
+        mtime = os.path.getmtime(index_path) if os.path.exists(index_path) else None
+        cached = self._atlas_rects.get(png_path)
+        if cached is None or cached[0] != mtime:
+            cached = self._atlas_rects[png_path] = (mtime, atlas_rects(png_path))
+        return cached[1]
+
+    def record(self, key: str, cfg_hash: str, output_path: str, seed: int = None, qa_scores: dict = None, **extra):
+        """Añade una entrada (se escribe y se hace flush inmediatamente)."""
+        entry = {
+            "key": key,
+            "config_hash": cfg_hash,
+            "output_path": output_path,
+            "seed": seed,
+            "qa_scores": qa_scores
+        }
+        entry.update(extra)
+
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.entries[key] = entry
+
+    def close(self):
+        self._file.close()
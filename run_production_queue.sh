@@ -21,6 +21,8 @@ echo ""
 COUNT=10
 STYLE_STRENGTH=0.6
 CPU_WORKERS=30
+QA_WORKERS=2
+GPU_BATCH=4
 MIN_CLIP_SCORE=65.0
 MIN_AESTHETIC=5.0
 MAX_RETRIES=3
@@ -30,10 +32,12 @@ echo "   ━━━━━━━━━━━━━━━━━━━━━━━
 echo "   GPU (RTX 5070 Ti):"
 echo "     • Generación continua (no espera)"
 echo "     • Resolución: 768x768"
+echo "     • Batch: $GPU_BATCH imágenes por llamada"
 echo "     • Estilo: IP-Adapter (fuerza $STYLE_STRENGTH)"
 echo ""
 echo "   CPU (32 hilos):"
-echo "     • $CPU_WORKERS workers evaluando en paralelo"
+echo "     • $CPU_WORKERS workers de post-procesado en paralelo"
+echo "     • $QA_WORKERS procesos QA compartidos (modelos cargados una vez)"
 echo "     • Modelo: CLIP-ViT-Large-Patch14"
 echo "     • Aesthetic Predictor activado"
 echo ""
@@ -70,6 +74,8 @@ if [[ $REPLY =~ ^[Ss]$ ]]; then
         --count $COUNT \
         --style_strength $STYLE_STRENGTH \
         --cpu_workers $CPU_WORKERS \
+        --qa_workers $QA_WORKERS \
+        --gpu_batch $GPU_BATCH \
         --min_clip_score $MIN_CLIP_SCORE \
         --min_aesthetic $MIN_AESTHETIC \
         --max_retries $MAX_RETRIES
@@ -0,0 +1,80 @@
+"""
+Transporte Zero-Copy de Imágenes entre Procesos
+Ring buffer de slots RGB de tamaño fijo en multiprocessing.shared_memory.
+Por la cola solo viaja el índice del slot; los workers leen la imagen como
+vista NumPy sin copiar y liberan el slot al terminar.
+"""
+import numpy as np
+from multiprocessing import Queue, shared_memory
+from PIL import Image
+
+class SharedImageRing:
+    """
+    Uso:
+        ring = SharedImageRing(num_slots=64, width=768, height=768)
+        slot = ring.acquire()          # Bloquea si todos los slots están ocupados
+        ring.write(slot, image)
+        task_queue.put({'slot': slot, ...})
+        # En el worker:
+        pixels = ring.view(slot)       # np.ndarray (H, W, 3) sin copia
+        ...
+        ring.release(slot)
+    Se pasa a los procesos hijos como argumento (se re-adjunta por nombre).
+    """
+    def __init__(self, num_slots: int, width: int = 768, height: int = 768):
+        self.num_slots = num_slots
+        self.shape = (height, width, 3)
+        self.slot_bytes = height * width * 3
+
+        self._shm = shared_memory.SharedMemory(create=True, size=num_slots * self.slot_bytes)
+        self.name = self._shm.name
+        self._owner = True
+
+        # Slots libres (la propia cola actúa como contrapresión para el productor)
+        self._free_slots = Queue()
+        for slot in range(num_slots):
+            self._free_slots.put(slot)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_shm']
+        state['_owner'] = False
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._shm = shared_memory.SharedMemory(name=self.name)
+
+    def acquire(self, timeout: float = None) -> int:
+        """Reserva un slot libre. Bloquea hasta que algún worker libere uno."""
+        return self._free_slots.get(timeout=timeout)
+
+    def release(self, slot: int):
+        """Devuelve el slot al ring para que el productor lo reutilice."""
+        self._free_slots.put(slot)
+
+    def view(self, slot: int) -> np.ndarray:
+        """Vista NumPy (H, W, 3) uint8 sobre el slot, sin copia."""
+        offset = slot * self.slot_bytes
+        return np.ndarray(self.shape, dtype=np.uint8, buffer=self._shm.buf, offset=offset)
+
+    def write(self, slot: int, image: Image.Image):
+        """Copia una imagen PIL al slot (única copia en todo el trayecto)."""
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        if image.size != (self.shape[1], self.shape[0]):
+            raise ValueError(f"Tamaño {image.size} no coincide con el slot {self.shape[1]}x{self.shape[0]}")
+        self.view(slot)[...] = np.asarray(image)
+
+    def image(self, slot: int) -> Image.Image:
+        """Copia PIL del slot, para etapas que necesitan una imagen propia."""
+        return Image.fromarray(self.view(slot))
+
+    def close(self):
+        """Desadjunta el segmento en este proceso."""
+        self._shm.close()
+
+    def unlink(self):
+        """Libera el segmento (solo el proceso creador)."""
+        if self._owner:
+            self._shm.unlink()
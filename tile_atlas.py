@@ -0,0 +1,130 @@
+"""
+Atlas de Tiles Procedurales
+Empaqueta todos los tiles procedurales de un bioma en un único PNG
+(una fila por item, una columna por variación) + un índice JSON que mapea
+(categoría, item, variación) al rectángulo en pixels.
+Uso en el juego:
+    atlas_img, rects = load_atlas("output_assets/Forest/tileset_atlas.json")
+    tile = crop_tile(atlas_img, rects[("Terrain", "grass tile", 1)])
+"""
+import os
+import json
+import numpy as np
+from PIL import Image
+
+ATLAS_BASENAME = "tileset_atlas"
+
+def atlas_paths(output_dir: str, biome: str):
+    """Rutas (png, json) del atlas de un bioma."""
+    base = os.path.join(output_dir, biome, ATLAS_BASENAME)
+    return base + ".png", base + ".json"
+
+def is_atlas_path(png_path: str) -> bool:
+    """True si la ruta es el PNG de un atlas de bioma (varios tiles en un solo fichero)."""
+    return os.path.basename(png_path) == ATLAS_BASENAME + ".png"
+
+def atlas_rects(png_path: str) -> dict:
+    """{(category, item, variation): [x, y, w, h]} del índice JSON junto al PNG del atlas ({} si no existe)."""
+    index_path = os.path.splitext(png_path)[0] + ".json"
+    if not os.path.exists(index_path):
+        return {}
+    with open(index_path, 'r') as f:
+        payload = json.load(f)
+    return {
+        (entry['category'], entry['item'], entry['variation']): [entry['x'], entry['y'], entry['w'], entry['h']]
+        for entry in payload['tiles']
+    }
+
+def merge_atlas_rows(rows: list, png_path: str, tile_size: int) -> list:
+    """
+    Combina las filas nuevas con las del atlas que ya está en disco: cada ejecución puede cubrir
+    solo algunas categorías y no debe borrar los tiles de las demás.
+    Las filas existentes conservan su posición (sus rectángulos siguen siendo válidos) y se
+    reemplazan si el item se regenera; los items nuevos se añaden al final.
+    Un atlas con otro tamaño de tile no se puede combinar y se descarta.
+    """
+    index_path = os.path.splitext(png_path)[0] + ".json"
+    if not (os.path.exists(png_path) and os.path.exists(index_path)):
+        return rows
+
+    with open(index_path, 'r') as f:
+        payload = json.load(f)
+    if payload.get('tile_size', tile_size) != tile_size:
+        return rows
+
+    with Image.open(png_path) as image:
+        existing = np.asarray(image.convert("RGBA"))
+
+    # Tiles existentes por (category, item), en el orden de sus filas
+    existing_rows = {}
+    for entry in sorted(payload['tiles'], key=lambda e: (e['y'], e['x'])):
+        x, y = entry['x'], entry['y']
+        tile = existing[y:y + tile_size, x:x + tile_size]
+        existing_rows.setdefault((entry['category'], entry['item']), []).append(tile)
+
+    new_rows = {(category, item): tiles for category, item, tiles in rows}
+    merged = []
+    for (category, item), tiles in existing_rows.items():
+        if (category, item) in new_rows:
+            tiles = new_rows.pop((category, item))
+        merged.append((category, item, tiles))
+    merged.extend((category, item, tiles) for (category, item), tiles in new_rows.items())
+    return merged
+
+def pack_atlas(rows: list, tile_size: int):
+    """
+    Compone el atlas en un único array RGBA.
+    rows: lista de (category, item, tiles) con tiles de forma (C, tile_size, tile_size, 4) uint8.
+    Retorna (atlas (H, W, 4) uint8, lista de entradas del índice).
+    """
+    columns = max((len(tiles) for _, _, tiles in rows), default=0)
+    atlas = np.zeros((len(rows) * tile_size, columns * tile_size, 4), dtype=np.uint8)
+    index = []
+
+    for row, (category, item, tiles) in enumerate(rows):
+        y = row * tile_size
+        for col, tile in enumerate(tiles):
+            x = col * tile_size
+            atlas[y:y + tile_size, x:x + tile_size] = tile
+            index.append({
+                'category': category,
+                'item': item,
+                'variation': col + 1,  # Misma numeración que los PNG sueltos
+                'x': x,
+                'y': y,
+                'w': tile_size,
+                'h': tile_size
+            })
+
+    return atlas, index
+
+def save_atlas(atlas: np.ndarray, index: list, png_path: str, metadata: dict = None) -> str:
+    """Escribe el PNG y su índice JSON (junto al PNG). Retorna la ruta del índice."""
+    Image.fromarray(atlas).save(png_path)
+
+    index_path = os.path.splitext(png_path)[0] + ".json"
+    payload = dict(metadata or {})
+    payload['image'] = os.path.basename(png_path)
+    payload['tiles'] = index
+
+    with open(index_path, 'w') as f:
+        json.dump(payload, f, indent=2)
+
+    return index_path
+
+def load_atlas(index_path: str):
+    """Carga un atlas: retorna (imagen RGBA, {(category, item, variation): (x, y, w, h)})."""
+    with open(index_path, 'r') as f:
+        payload = json.load(f)
+
+    image = Image.open(os.path.join(os.path.dirname(index_path), payload['image'])).convert("RGBA")
+    rects = {
+        (entry['category'], entry['item'], entry['variation']): (entry['x'], entry['y'], entry['w'], entry['h'])
+        for entry in payload['tiles']
+    }
+    return image, rects
+
+def crop_tile(atlas_image: Image.Image, rect: tuple) -> Image.Image:
+    """Recorta un tile del atlas a partir de su rectángulo (x, y, w, h)."""
+    x, y, w, h = rect
+    return atlas_image.crop((x, y, x + w, y + h))
@@ -0,0 +1,114 @@
+"""
+Caché en Disco de Tiles Procedurales
+Los tiles procedurales son funciones puras de sus parámetros (categoría, item,
+bioma, variación, tile_size, paleta, post-procesado y versión del generador).
+Cada PNG se guarda una vez bajo el hash de esos parámetros y se materializa en
+el árbol de salida con un hardlink (o copia) en las siguientes ejecuciones.
+La caché se limita en tamaño con expulsión LRU (mtime = último uso).
+"""
+import os
+import shutil
+import tempfile
+
+def _file_mode() -> int:
+    """Permisos de un fichero nuevo según la umask del proceso (como los PNG escritos con open())."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+class TileCache:
+    """
+    Uso:
+        cache = TileCache(".tile_cache", max_bytes=512 * 1024 * 1024, mode="hardlink")
+        if not cache.fetch(key, save_path):
+            ...generar y guardar en save_path...
+            cache.store(key, save_path)
+        cache.trim()  # Al terminar (un solo proceso)
+    Se pasa a los procesos hijos como argumento (solo contiene rutas y configuración).
+    """
+    MODES = ("hardlink", "copy")
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024, mode: str = "hardlink"):
+        if mode not in self.MODES:
+            raise ValueError(f"Modo de caché desconocido: {mode} (opciones: {', '.join(self.MODES)})")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.mode = mode
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_path(self, key: str) -> str:
+        # Dos niveles para no acumular miles de ficheros en un solo directorio
+        return os.path.join(self.cache_dir, key[:2], key + ".png")
+
+    def fetch(self, key: str, dest_path: str) -> bool:
+        """Materializa la entrada en dest_path. Retorna False si no está en caché."""
+        entry = self._entry_path(key)
+        if not os.path.exists(entry):
+            return False
+
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        # Nunca escribir sobre un destino existente: podría ser un hardlink a otra entrada
+        if os.path.lexists(dest_path):
+            os.remove(dest_path)
+
+        try:
+            if self.mode == "hardlink":
+                try:
+                    os.link(entry, dest_path)
+                except OSError:
+                    shutil.copyfile(entry, dest_path)  # Otro sistema de ficheros: copiar
+            else:
+                shutil.copyfile(entry, dest_path)
+        except FileNotFoundError:
+            return False  # Expulsada entre la comprobación y el enlace
+
+        os.utime(entry)  # Marca de uso para la expulsión LRU
+        return True
+
+    def store(self, key: str, src_path: str):
+        """Copia un tile recién generado a la caché (escritura atómica)."""
+        entry = self._entry_path(key)
+        if os.path.exists(entry):
+            return
+
+        entry_dir = os.path.dirname(entry)
+        os.makedirs(entry_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=entry_dir, suffix=".tmp")
+        os.close(fd)
+        shutil.copyfile(src_path, tmp_path)
+        # mkstemp crea con 0600 y los hardlinks del árbol de salida comparten el inode
+        os.chmod(tmp_path, _file_mode())
+        os.replace(tmp_path, entry)
+
+    def size_bytes(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def trim(self) -> int:
+        """Expulsa las entradas menos usadas hasta quedar bajo max_bytes. Retorna cuántas se borraron."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+
+        for path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)  # Los hardlinks del árbol de salida siguen siendo válidos
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+
+        return removed